@@ -1,8 +1,44 @@
 import heapq
+import itertools
 import random
 import time
 import math 
-from copy import deepcopy
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from busca_entre_rotas import busca_entre_rotas
+from divisao_rotas import dividir_rota, rota_gigante
+from matriz_distancias import (MatrizDistancias, custos_trechos, indices_sequencia, terminais_clientes,
+                               vizinhos_mais_proximos)
+from rota import Rota, TabelaServicos, avaliar_rotas, custo_solucao
+
+# Fases de uma iteração do GRASP, na ordem em que rodam (cada construtivo usa "savings" ou "split";
+# a busca entre rotas substitui realocação + refusão)
+FASES_GRASP = ("construcao", "savings", "split", "entre_rotas", "2opt", "realocacao", "refusao")
+CONSTRUTIVOS = ("savings", "split")
+RELOGIOS = {"parede": time.perf_counter, "cpu": time.process_time}
+# two_opt_vizinhanca e o savings consultam o prazo a cada tantas entradas retiradas da fila
+INTERVALO_PRAZO = 64
+
+
+class Prazo:
+    # Instante limite medido em tempo de parede ou de CPU do processo
+    __slots__ = ('relogio', 'limite')
+
+    def __init__(self, segundos, medida="parede"):
+        self.relogio = RELOGIOS[medida]
+        self.limite = self.relogio() + segundos
+
+    def restante(self):
+        return max(self.limite - self.relogio(), 0.0)
+
+    def esgotado(self):
+        return self.relogio() >= self.limite
+
 
 def preparar_clientes(vertices_req, arestas_req, arcos_req):
     clientes = []
@@ -18,131 +54,191 @@ def preparar_clientes(vertices_req, arestas_req, arcos_req):
         id_servico += 1
     return clientes
 
-def inicializar_rotas(clientes, deposito, distancias):
-    rotas = []
-    for cliente in clientes:
-        rota = {
-            'clientes': [cliente],
-            'demanda_total': cliente['demanda'],
-            'servicos': {(cliente['tipo'], cliente['id'])},
-            'sequencia': [deposito, cliente['origem'], cliente['destino'], deposito]
-        }
-        rotas.append(rota)
-    return rotas
+def inicializar_rotas(tabela, deposito, distancias, ordem=None):
+    if ordem is None:
+        ordem = range(len(tabela))
+    return avaliar_rotas([Rota.unitaria(tabela, s, deposito) for s in ordem], distancias)
+
+def custos_fusao(r1, r2, distancias, deposito):
+    # Custo de transporte das quatro orientações de r1 seguida de r2, em O(1) a partir dos
+    # custos em cache de cada rota (ida e volta) e das pontas das sequências.
+    f1, l1 = r1.sequencia[1], r1.sequencia[-2]
+    f2, l2 = r2.sequencia[1], r2.sequencia[-2]
+    d = distancias.d
+    ida1 = r1.custo_transporte(distancias) - d(deposito, f1) - d(l1, deposito)
+    volta1 = r1.custo_transporte_reverso(distancias) - d(deposito, l1) - d(f1, deposito)
+    ida2 = r2.custo_transporte(distancias) - d(deposito, f2) - d(l2, deposito)
+    volta2 = r2.custo_transporte_reverso(distancias) - d(deposito, l2) - d(f2, deposito)
+    return [
+        d(deposito, f1) + ida1 + d(l1, f2) + ida2 + d(l2, deposito),
+        d(deposito, f1) + ida1 + d(l1, l2) + volta2 + d(f2, deposito),
+        d(deposito, l1) + volta1 + d(f1, f2) + ida2 + d(l2, deposito),
+        d(deposito, l1) + volta1 + d(f1, l2) + volta2 + d(f2, deposito),
+    ]
+
+def sequencia_fusao(r1, r2, deposito, orientacao):
+    s1 = r1.sequencia[:-1] if orientacao in (0, 1) else [deposito] + r1.sequencia[-2:0:-1]
+    s2 = r2.sequencia[1:] if orientacao in (0, 2) else r2.sequencia[-2:0:-1] + [deposito]
+    return s1 + s2
 
 def calcular_savings_inicial(rotas, distancias, deposito):
-    savings = []
+    # Todos os savings de uma vez sobre a matriz numpy; o heap é montado com heapify
     n = len(rotas)
-    for i in range(n):
-        for j in range(i+1, n):
-            fim_i = rotas[i]['sequencia'][-2]
-            ini_j = rotas[j]['sequencia'][1]
-            saving = distancias[fim_i][deposito] + distancias[deposito][ini_j] - distancias[fim_i][ini_j]
-            heapq.heappush(savings, (-saving, i, j))
+    if n < 2:
+        return []
+    idx_fim = np.array([distancias.indice[r.sequencia[-2]] for r in rotas], dtype=np.int64)
+    idx_ini = np.array([distancias.indice[r.sequencia[1]] for r in rotas], dtype=np.int64)
+    idx_dep = distancias.indice[deposito]
+    ate_deposito = distancias.valores(idx_fim, idx_dep)
+    do_deposito = distancias.valores(idx_dep, idx_ini)
+
+    i, j = np.triu_indices(n, k=1)
+    saving = ate_deposito[i] + do_deposito[j] - distancias.valores(idx_fim[i], idx_ini[j])
+    savings = list(zip((-saving).tolist(), i.tolist(), j.tolist()))
+    heapq.heapify(savings)
     return savings
 
-def juntar_rotas_com_heap(rotas, distancias, deposito, capacidade, ganho_minimo=0.1):
+def juntar_rotas_com_heap(rotas, distancias, deposito, capacidade, ganho_minimo=0.1, instrumentacao=None,
+                          prazo=None):
+    # Clarke-Wright: cada candidato é avaliado em O(1) (custos_fusao) e só a sequência
+    # vencedora é montada. Se o `prazo` acabar no meio, devolve None (iteração descartada).
     savings = calcular_savings_inicial(rotas, distancias, deposito)
+    d = distancias.d
     rotas_ativas = {i for i in range(len(rotas))}
     mapa_rota = {i: rotas[i] for i in rotas_ativas}
+    proximo_id = len(rotas)
 
-    demanda_total = sum(r['demanda_total'] for r in rotas)
+    demanda_total = sum(r.demanda_total for r in rotas)
     minimo_rotas = math.ceil(demanda_total / capacidade)
+    retiradas = 0
+    rejeitadas = 0
+    interrompido = False
 
     while savings and len(rotas_ativas) > minimo_rotas:
+        if prazo is not None and retiradas % INTERVALO_PRAZO == 0 and prazo.esgotado():
+            interrompido = True
+            break
+        # Compacta o heap quando as entradas de rotas já fundidas dominam; a ordem de
+        # retirada não muda, pois só depende das chaves.
+        r = len(rotas_ativas)
+        if len(savings) > 2 * r * r + 1024:
+            savings = [e for e in savings if e[1] in rotas_ativas and e[2] in rotas_ativas]
+            heapq.heapify(savings)
+            if not savings:
+                break
+
         neg_saving, i, j = heapq.heappop(savings)
+        retiradas += 1
         if i not in rotas_ativas or j not in rotas_ativas:
+            rejeitadas += 1
             continue
 
         rota_i = mapa_rota[i]
         rota_j = mapa_rota[j]
 
-        if rota_i['demanda_total'] + rota_j['demanda_total'] > capacidade:
+        if rota_i.demanda_total + rota_j.demanda_total > capacidade:
+            rejeitadas += 1
             continue
-        if rota_i['servicos'] & rota_j['servicos']:
-            continue
-
-        seqs_candidatas = [
-            rota_i['sequencia'][:-1] + rota_j['sequencia'][1:],              
-            rota_i['sequencia'][:-1] + rota_j['sequencia'][-2:0:-1] + [deposito],
-            [deposito] + rota_i['sequencia'][-2:0:-1] + rota_j['sequencia'][1:], 
-            [deposito] + rota_i['sequencia'][-2:0:-1] + rota_j['sequencia'][-2:0:-1] + [deposito]
-        ]
 
-        melhor_seq = None
+        custo_antigo = rota_i.custo_transporte(distancias) + rota_j.custo_transporte(distancias)
+        melhor_orientacao = None
+        melhor_transporte = None
         melhor_ganho = float('-inf')
 
-        custo_servico = sum(c['custo'] for c in rota_i['clientes'] + rota_j['clientes'])
-
-        for seq in seqs_candidatas:
-            if seq[0] != deposito or seq[-1] != deposito:
-                continue
-
-            custo_transporte = sum(distancias[seq[k]][seq[k+1]] for k in range(len(seq)-1))
-            custo_total_novo = custo_transporte + custo_servico
-
-            custo_transporte_antigo = sum(distancias[rota_i['sequencia'][k]][rota_i['sequencia'][k+1]] for k in range(len(rota_i['sequencia'])-1)) + \
-                                     sum(distancias[rota_j['sequencia'][k]][rota_j['sequencia'][k+1]] for k in range(len(rota_j['sequencia'])-1))
-            custo_total_antigo = custo_transporte_antigo + custo_servico
-
-            ganho = custo_total_antigo - custo_total_novo
-
+        for orientacao, custo_transporte in enumerate(custos_fusao(rota_i, rota_j, distancias, deposito)):
+            ganho = custo_antigo - custo_transporte
             if ganho > melhor_ganho and ganho >= ganho_minimo:
                 melhor_ganho = ganho
-                melhor_seq = seq
+                melhor_orientacao = orientacao
+                melhor_transporte = custo_transporte
 
-        if melhor_seq is None:
+        if melhor_orientacao is None:
+            rejeitadas += 1
             continue
 
-        nova_rota = {
-            'clientes': rota_i['clientes'] + rota_j['clientes'],
-            'demanda_total': rota_i['demanda_total'] + rota_j['demanda_total'],
-            'servicos': rota_i['servicos'] | rota_j['servicos'],
-            'sequencia': melhor_seq
-        }
-        nova_id = max(mapa_rota.keys()) + 1
+        nova_rota = rota_i.juntar(rota_j, sequencia_fusao(rota_i, rota_j, deposito, melhor_orientacao),
+                                  melhor_transporte)
+        nova_id = proximo_id
+        proximo_id += 1
         rotas_ativas.remove(i)
         rotas_ativas.remove(j)
         rotas_ativas.add(nova_id)
+        del mapa_rota[i]
+        del mapa_rota[j]
         mapa_rota[nova_id] = nova_rota
 
+        fim_nova = nova_rota.sequencia[-2]
+        ini_nova = nova_rota.sequencia[1]
+        volta_fim_nova = d(fim_nova, deposito)
+        ida_ini_nova = d(deposito, ini_nova)
         for k in rotas_ativas:
             if k == nova_id:
                 continue
-            fim_nova = nova_rota['sequencia'][-2]
-            ini_k = mapa_rota[k]['sequencia'][1]
-            saving1 = distancias[fim_nova][deposito] + distancias[deposito][ini_k] - distancias[fim_nova][ini_k]
-
-            fim_k = mapa_rota[k]['sequencia'][-2]
-            ini_nova = nova_rota['sequencia'][1]
-            saving2 = distancias[fim_k][deposito] + distancias[deposito][ini_nova] - distancias[fim_k][ini_nova]
+            seq_k = mapa_rota[k].sequencia
+            ini_k = seq_k[1]
+            fim_k = seq_k[-2]
+            saving1 = volta_fim_nova + d(deposito, ini_k) - d(fim_nova, ini_k)
+            saving2 = d(fim_k, deposito) + ida_ini_nova - d(fim_k, ini_nova)
 
             heapq.heappush(savings, (-saving1, nova_id, k))
             heapq.heappush(savings, (-saving2, k, nova_id))
 
+    if instrumentacao is not None:
+        instrumentacao.contar("savings.retiradas_heap", retiradas)
+        instrumentacao.contar("savings.rejeitadas", rejeitadas)
+        instrumentacao.contar("savings.fusoes", retiradas - rejeitadas)
+    if interrompido:
+        return None
     return [mapa_rota[i] for i in rotas_ativas]
 
-def two_opt(seq, distancias, max_iter=1000, verbose=False):
-    melhor_seq = seq
-    melhor_custo = sum(distancias[seq[i]][seq[i+1]] for i in range(len(seq)-1))
+def _somas_prefixo(seq, distancias):
+    # ida[k] / volta[k]: custo de seq[0..k] percorrida no sentido direto / inverso
+    ida = [0]
+    ida.extend(itertools.accumulate(custos_trechos(distancias, seq).tolist()))
+    volta = [0]
+    volta.extend(itertools.accumulate(custos_trechos(distancias, seq, reverso=True).tolist()))
+    return ida, volta
+
+def two_opt(seq, distancias, max_iter=1000, verbose=False, instrumentacao=None, prazo=None):
+    # Cada movimento é avaliado em O(1) pelas quatro pontas afetadas; o custo do trecho
+    # invertido vem de somas de prefixo nos dois sentidos (arcos podem ser assimétricos).
+    seq = list(seq)
+    n = len(seq)
+    melhor_custo = sum(custos_trechos(distancias, seq).tolist())
     iter_count = 0
+    movimentos = 0
     melhorou = True
 
     while melhorou and iter_count < max_iter:
+        if prazo is not None and prazo.esgotado():
+            break
         melhorou = False
         iter_count += 1
 
-        for i in range(1, len(seq) - 2):
-            for j in range(i+1, len(seq) -1):
-                if j - i == 1:
-                    continue
-                nova_seq = seq[:i] + seq[i:j][::-1] + seq[j:]
-                novo_custo = sum(distancias[nova_seq[k]][nova_seq[k+1]] for k in range(len(nova_seq)-1))
-                if novo_custo < melhor_custo:
-                    melhor_seq = nova_seq
-                    melhor_custo = novo_custo
-                    melhorou = True
-        seq = melhor_seq
+        ida, volta = _somas_prefixo(seq, distancias)
+        # Submatriz das posições de seq lida de uma vez: sub[p][q] = d(seq[p], seq[q])
+        idx = indices_sequencia(distancias, seq)
+        sub = distancias.valores(idx[:, None], idx[None, :]).tolist()
+
+        melhor_delta = 0
+        melhor_mov = None
+        for i in range(1, n - 2):
+            dist_a = sub[i-1]
+            dist_b = sub[i]
+            custo_ab = dist_a[i]
+            for j in range(i+2, n - 1):
+                delta = (dist_a[j-1] + dist_b[j] + (volta[j-1] - volta[i])
+                         - custo_ab - sub[j-1][j] - (ida[j-1] - ida[i]))
+                if delta < melhor_delta:
+                    melhor_delta = delta
+                    melhor_mov = (i, j)
+
+        if melhor_mov is not None:
+            i, j = melhor_mov
+            seq[i:j] = seq[i:j][::-1]
+            melhor_custo += melhor_delta
+            movimentos += 1
+            melhorou = True
 
         if verbose and iter_count % 100 == 0:
             print(f"2-opt iteração {iter_count}: custo atual {melhor_custo}")
@@ -150,197 +246,516 @@ def two_opt(seq, distancias, max_iter=1000, verbose=False):
     if verbose:
         print(f"2-opt finalizou após {iter_count} iterações com custo {melhor_custo}")
 
-    return melhor_seq, melhor_custo
+    if instrumentacao is not None:
+        instrumentacao.contar("2opt.passadas", iter_count)
+        instrumentacao.contar("2opt.movimentos", movimentos)
+    return seq, melhor_custo
+
+def two_opt_vizinhanca(seq, distancias, vizinhos, max_iter=1000, verbose=False, instrumentacao=None,
+                       prazo=None):
+    # 2-opt por primeira melhora restrito às listas de vizinhos, com don't-look bits:
+    # só voltam para a fila as posições vizinhas de um movimento aplicado.
+    seq = list(seq)
+    n = len(seq)
+    custo = sum(custos_trechos(distancias, seq).tolist())
+    if n < 5:
+        return seq, custo
+
+    def preparar():
+        ida, volta = _somas_prefixo(seq, distancias)
+        posicoes = {}
+        for k in range(1, n - 1):
+            posicoes.setdefault(seq[k], []).append(k)
+        return ida, volta, posicoes
+
+    dist = distancias.d
+
+    def delta(i, j):
+        a, b, c, d = seq[i-1], seq[i], seq[j-1], seq[j]
+        return (dist(a, c) + dist(b, d) + (volta[j-1] - volta[i])
+                - dist(a, b) - dist(c, d) - (ida[j-1] - ida[i]))
+
+    def candidatos(p):
+        x = seq[p]
+        for y in vizinhos.get(x, ()):
+            for q in posicoes.get(y, ()):
+                yield p + 1, q + 1  # x = a, y = c
+                yield p, q          # x = b, y = d
+                yield q + 1, p + 1  # x = c, y = a
+                yield q, p          # x = d, y = b
+
+    ida, volta, posicoes = preparar()
+    fila = deque(range(1, n - 1))
+    na_fila = [False] + [True] * (n - 2) + [False]
+    movimentos = 0
+    passadas = 0
+    limite_movimentos = max_iter * n
+
+    while fila and movimentos < limite_movimentos:
+        if prazo is not None and passadas % INTERVALO_PRAZO == 0 and prazo.esgotado():
+            break
+        p = fila.popleft()
+        passadas += 1
+        na_fila[p] = False
+        for i, j in candidatos(p):
+            if i < 1 or j > n - 2 or j - i < 2:
+                continue
+            ganho = delta(i, j)
+            if ganho < 0:
+                seq[i:j] = seq[i:j][::-1]
+                custo += ganho
+                movimentos += 1
+                ida, volta, posicoes = preparar()
+                for q in (i - 1, i, j - 1, j, p):
+                    if 0 < q < n - 1 and not na_fila[q]:
+                        na_fila[q] = True
+                        fila.append(q)
+                break
+
+    if verbose:
+        print(f"2-opt (vizinhança) finalizou após {movimentos} movimentos com custo {custo}")
 
-def aplicar_2opt_em_todas_rotas(rotas, distancias, max_iter=20, verbose=False):
+    if instrumentacao is not None:
+        instrumentacao.contar("2opt.passadas", passadas)
+        instrumentacao.contar("2opt.movimentos", movimentos)
+    return seq, custo
+
+def aplicar_2opt_em_todas_rotas(rotas, distancias, max_iter=20, verbose=False, vizinhos=None,
+                                instrumentacao=None, prazo=None):
+    # Ao fim do prazo as rotas restantes ficam como estão (sequências sempre válidas)
     for idx, rota in enumerate(rotas, 1):
+        if prazo is not None and prazo.esgotado():
+            break
         if verbose:
-            print(f"Iniciando 2-opt na rota {idx} com tamanho {len(rota['sequencia'])}")
-        seq_atual = rota['sequencia']
-        seq_melhor, _ = two_opt(seq_atual, distancias, max_iter=max_iter, verbose=verbose)
-        rota['sequencia'] = seq_melhor
+            print(f"Iniciando 2-opt na rota {idx} com tamanho {len(rota.sequencia)}")
+        seq_atual = rota.sequencia
+        if vizinhos is None:
+            seq_melhor, custo = two_opt(seq_atual, distancias, max_iter=max_iter, verbose=verbose,
+                                        instrumentacao=instrumentacao, prazo=prazo)
+        else:
+            seq_melhor, custo = two_opt_vizinhanca(seq_atual, distancias, vizinhos, max_iter=max_iter,
+                                                   verbose=verbose, instrumentacao=instrumentacao, prazo=prazo)
+        rota.definir_sequencia(seq_melhor, custo)
         if verbose:
             print(f"Rota {idx} otimizada")
     return rotas
 
+def ordem_visitas(rota):
+    # Serviços atendidos em cada trecho da sequência, na ordem do percurso, numa só passada:
+    # os serviços pendentes ficam indexados pelo trecho que os atende (arcos e nós no sentido
+    # origem -> destino, arestas nos dois sentidos), na ordem de `rota.servicos`
+    tabela = rota.tabela
+    pendentes = {}
+    for pos, s in enumerate(rota.servicos):
+        origem, destino = tabela.origem[s], tabela.destino[s]
+        if tabela.tipo[s] == 'e':
+            chave = (True, min(origem, destino), max(origem, destino))
+        else:
+            chave = (False, origem, destino)
+        pendentes.setdefault(chave, []).append((pos, s))
+
+    visitas = []
+    seq = rota.sequencia
+    for k in range(len(seq) - 1):
+        u, v = seq[k], seq[k + 1]
+        direto = pendentes.pop((False, u, v), None)
+        aresta = pendentes.pop((True, min(u, v), max(u, v)), None)
+        if direto is None and aresta is None:
+            continue
+        atendidos = (direto or []) + (aresta or [])
+        if direto and aresta:
+            atendidos.sort()
+        visitas.extend((s, u, v) for _, s in atendidos)
+    return visitas
+
+def formatar_solucao(rotas, deposito, matriz_dist):
+    # Texto do arquivo de solução e o custo total, calculado uma única vez
+    custo_total_global = custo_solucao(rotas, matriz_dist)
+    linhas = [f"{custo_total_global}\n{len(rotas)}\n{random.randint(10000000, 999999999)}\n{int(time.time())}\n"]
+
+    for i, rota in enumerate(rotas, start=1):
+        tabela = rota.tabela
+        visitas = ordem_visitas(rota)
+        custo_servico = sum(tabela.custo[s] for s, _, _ in visitas)
+        custo_rota = int(rota.custo_transporte(matriz_dist) + custo_servico)
+        texto_visitas = " ".join(f"(S {tabela.id[s]},{u},{v})" for s, u, v in visitas)
+        linhas.append(f" 0 1 {i} {rota.demanda_total} {custo_rota}  {len(visitas) + 2} (D 0,1,1) "
+                      f"{texto_visitas} (D 0,1,1)\n")
+    return "".join(linhas), custo_total_global
+
 def salvar_solucao(rotas, nome_arquivo, deposito, matriz_dist):
+    texto, custo_total = formatar_solucao(rotas, deposito, matriz_dist)
     with open(nome_arquivo, "w", encoding="utf-8") as f:
-        custo_total_global = 0
-        for rota in rotas:
-            seq = rota["sequencia"]
-            custo_transporte = sum(matriz_dist[seq[k]][seq[k + 1]] for k in range(len(seq) - 1))
-            custo_servico = sum(c['custo'] for c in rota["clientes"])
-            custo_total_global += custo_transporte + custo_servico
-
-        f.write(f"{custo_total_global}\n")
-        f.write(f"{len(rotas)}\n")
-        f.write(f"{random.randint(10000000, 999999999)}\n")
-        f.write(f"{int(time.time())}\n")
-
-        for i, rota in enumerate(rotas, start=1):
-            seq = rota["sequencia"]
-            visitas = []
-            custo_transporte = 0
-            custo_servico = 0
-            visitados = set()
-
-            for k in range(len(seq) - 1):
-                u = seq[k]
-                v = seq[k + 1]
-                custo_transporte += matriz_dist[u][v]
-                for cliente in rota["clientes"]:
-                    chave = (cliente["tipo"], cliente["id"])
-                    if chave in visitados:
-                        continue
-                    if (cliente["tipo"] == 'a' and cliente["origem"] == u and cliente["destino"] == v) or \
-                       (cliente["tipo"] == 'e' and ((min(u,v), max(u,v)) == (min(cliente["origem"], cliente["destino"]), max(cliente["origem"], cliente["destino"])))) or \
-                       (cliente["tipo"] == 'n' and cliente["origem"] == u and cliente["destino"] == v):
-                        visitas.append(f"(S {cliente['id']},{u},{v})")
-                        visitados.add(chave)
-                        custo_servico += cliente['custo']
-
-            total_visitas = len(visitas) + 2
-            demanda_total = rota['demanda_total']
-            linha = f" 0 1 {i} {demanda_total} {int(custo_transporte + custo_servico)}  {total_visitas} (D 0,1,1) "
-            linha += " ".join(visitas) + " (D 0,1,1)\n"
-            f.write(linha)
-
-def custo_total_rota(rota, distancias):
-    seq = rota["sequencia"]
-    custo_transporte = sum(distancias[seq[i]][seq[i+1]] for i in range(len(seq)-1))
-    custo_servico = sum(c['custo'] for c in rota["clientes"])
-    return custo_transporte + custo_servico
-
-def realocar_rotas_pequenas(rotas, capacidade, distancias, deposito, verbose=False):
+        f.write(texto)
+    return custo_total
+
+def realocar_rotas_pequenas(rotas, capacidade, distancias, deposito, verbose=False, vizinhos=None,
+                            instrumentacao=None):
+    d = distancias.d
     novas_rotas = []
     pendentes = []
 
     for rota in rotas:
-        if len(rota["clientes"]) <= 2:
+        if len(rota.servicos) <= 2:
             pendentes.append(rota)
         else:
             novas_rotas.append(rota)
 
+    # Com listas de vizinhos, só são testadas as rotas que passam perto da origem do cliente
+    rotas_por_vertice = None
+    if vizinhos is not None:
+        rotas_por_vertice = {}
+        for idx, rota in enumerate(novas_rotas):
+            for v in rota.sequencia[1:-1]:
+                rotas_por_vertice.setdefault(v, set()).add(idx)
+
+    realocados = 0
     for rota_pequena in pendentes:
-        clientes_nao_alocados = []
+        tabela = rota_pequena.tabela
+        nao_alocados = []
 
-        for cliente in rota_pequena["clientes"]:
+        for s in rota_pequena.servicos:
+            origem, destino = tabela.origem[s], tabela.destino[s]
             alocado = False
-            for rota in novas_rotas:
-                if rota["demanda_total"] + cliente["demanda"] > capacidade:
+            if rotas_por_vertice is None:
+                candidatas = range(len(novas_rotas))
+            else:
+                ids = set()
+                for v in [origem] + vizinhos.get(origem, []):
+                    ids |= rotas_por_vertice.get(v, set())
+                candidatas = sorted(ids)
+
+            for idx in candidatas:
+                rota = novas_rotas[idx]
+                if rota.demanda_total + tabela.demanda[s] > capacidade:
                     continue
-                if (cliente["tipo"], cliente["id"]) in rota["servicos"]:
-                    continue
-
-                nova_seq = rota["sequencia"][:-1] + [cliente["origem"], cliente["destino"], rota["sequencia"][-1]]
-                nova_custo = sum(distancias[nova_seq[k]][nova_seq[k+1]] for k in range(len(nova_seq)-1))
-                atual_custo = sum(distancias[rota["sequencia"][k]][rota["sequencia"][k+1]] for k in range(len(rota["sequencia"])-1))
 
-                if nova_custo < atual_custo + 2 * distancias[rota["sequencia"][-2]][cliente["origem"]]:
-                    rota["clientes"].append(cliente)
-                    rota["demanda_total"] += cliente["demanda"]
-                    rota["servicos"].add((cliente["tipo"], cliente["id"]))
-                    rota["sequencia"] = nova_seq
+                ultimo = rota.sequencia[-2]
+                fim = rota.sequencia[-1]
+                acrescimo = (d(ultimo, origem) + d(origem, destino)
+                             + d(destino, fim) - d(ultimo, fim))
+
+                if acrescimo < 2 * d(ultimo, origem):
+                    rota.adicionar(s, rota.sequencia[:-1] + [origem, destino, fim],
+                                   rota.custo_transporte(distancias) + acrescimo)
+                    if rotas_por_vertice is not None:
+                        rotas_por_vertice.setdefault(origem, set()).add(idx)
+                        rotas_por_vertice.setdefault(destino, set()).add(idx)
                     alocado = True
+                    realocados += 1
                     break
 
             if not alocado:
-                clientes_nao_alocados.append(cliente)
+                nao_alocados.append(s)
 
-        if clientes_nao_alocados:
+        if nao_alocados:
             if verbose:
-                print(f"⚠️ Rota com {len(clientes_nao_alocados)} clientes não realocados foi mantida.")
-            nova_rota = {
-                'clientes': clientes_nao_alocados,
-                'demanda_total': sum(c['demanda'] for c in clientes_nao_alocados),
-                'servicos': {(c['tipo'], c['id']) for c in clientes_nao_alocados},
-                'sequencia': [deposito] + [c['origem'] for c in clientes_nao_alocados] + [c['destino'] for c in reversed(clientes_nao_alocados)] + [deposito]
-            }
+                print(f"⚠️ Rota com {len(nao_alocados)} clientes não realocados foi mantida.")
+            sequencia = ([deposito] + [tabela.origem[s] for s in nao_alocados]
+                         + [tabela.destino[s] for s in reversed(nao_alocados)] + [deposito])
+            nova_rota = Rota(tabela, nao_alocados, sequencia)
             novas_rotas.append(nova_rota)
-    return novas_rotas
+            if rotas_por_vertice is not None:
+                for v in nova_rota.sequencia[1:-1]:
+                    rotas_por_vertice.setdefault(v, set()).add(len(novas_rotas) - 1)
 
-def refundir_rotas(rotas, distancias, deposito, capacidade, ganho_minimo=0.1, verbose=False):
-    novas_rotas = deepcopy(rotas)
-    mudou = True
-
-    while mudou:
-        mudou = False
-        n = len(novas_rotas)
-        melhor_par = None
-        melhor_seq = None
-        melhor_ganho = 0
-
-        for i in range(n):
-            for j in range(i+1, n):
-                r1, r2 = novas_rotas[i], novas_rotas[j]
+    if instrumentacao is not None:
+        instrumentacao.contar("realocacao.rotas_pequenas", len(pendentes))
+        instrumentacao.contar("realocacao.servicos_realocados", realocados)
+    return novas_rotas
 
-                if r1["servicos"] & r2["servicos"]:
-                    continue
-                if r1["demanda_total"] + r2["demanda_total"] > capacidade:
-                    continue
-                seqs = [
-                    r1['sequencia'][:-1] + r2['sequencia'][1:],
-                    r1['sequencia'][:-1] + r2['sequencia'][-2:0:-1] + [deposito],
-                    [deposito] + r1['sequencia'][-2:0:-1] + r2['sequencia'][1:],
-                    [deposito] + r1['sequencia'][-2:0:-1] + r2['sequencia'][-2:0:-1] + [deposito],
-                ]
-                custo_servico = sum(c['custo'] for c in r1['clientes'] + r2['clientes'])
-                custo_antigo = custo_total_rota(r1, distancias) + custo_total_rota(r2, distancias)
-
-                for seq in seqs:
-                    if seq[0] != deposito or seq[-1] != deposito:
-                        continue
-
-                    servicos_visita = set()
-                    for c in r1['clientes'] + r2['clientes']:
-                        servicos_visita.add((c['tipo'], c['id']))
-                    if len(servicos_visita) != len(r1['clientes']) + len(r2['clientes']):
-                        continue
-
-                    custo_novo = sum(distancias[seq[k]][seq[k+1]] for k in range(len(seq)-1)) + custo_servico
-                    ganho = custo_antigo - custo_novo
-                    if ganho > melhor_ganho and ganho >= ganho_minimo:
-                        melhor_ganho = ganho
-                        melhor_par = (i, j)
-                        melhor_seq = seq
-
-        if melhor_par:
-            i, j = melhor_par
-            novos_clientes = novas_rotas[i]["clientes"] + novas_rotas[j]["clientes"]
-            novos_servicos = novas_rotas[i]["servicos"] | novas_rotas[j]["servicos"]
-            nova_rota = {
-                "clientes": novos_clientes,
-                "demanda_total": novas_rotas[i]["demanda_total"] + novas_rotas[j]["demanda_total"],
-                "servicos": novos_servicos,
-                "sequencia": melhor_seq
-            }
-            novas = [r for idx, r in enumerate(novas_rotas) if idx not in (i, j)]
-            novas.append(nova_rota)
-            novas_rotas = novas
-            mudou = True
-            if verbose:
-                print(f"Refundiu rotas {i} e {j} -> total agora: {len(novas_rotas)}")
-        else:
-            if verbose:
-                print("Nenhuma fusão adicional possível, encerrando refusão.")
+def refundir_rotas(rotas, distancias, deposito, capacidade, ganho_minimo=0.1, verbose=False,
+                   instrumentacao=None):
+    # Fusão gulosa pelo maior ganho. Os ganhos de cada par ficam num heap com remoção
+    # preguiçosa; após uma fusão só os pares com a rota nova são calculados. Empates seguem
+    # a ordem da lista (rotas novas vão para o fim), como na varredura completa.
+    ativas = dict(enumerate(rotas))
+    proximo_id = len(ativas)
+    heap = []
+    fusoes = {}
+    total_fusoes = 0
+
+    def avaliar_par(a, b):
+        r1, r2 = ativas[a], ativas[b]
+        if r1.demanda_total + r2.demanda_total > capacidade:
+            return None
+        custo_antigo = r1.custo_total(distancias) + r2.custo_total(distancias)
+        custo_servico = r1.custo_servico + r2.custo_servico
+        melhor = None
+        for orientacao, custo_transporte in enumerate(custos_fusao(r1, r2, distancias, deposito)):
+            ganho = custo_antigo - (custo_transporte + custo_servico)
+            if ganho > 0 and ganho >= ganho_minimo and (melhor is None or ganho > melhor[0]):
+                melhor = (ganho, orientacao, custo_transporte)
+        if melhor is None:
+            return None
+        fusoes[(a, b)] = melhor
+        return (-melhor[0], a, b)
+
+    ids = list(ativas)
+    for x in range(len(ids)):
+        for y in range(x + 1, len(ids)):
+            entrada = avaliar_par(ids[x], ids[y])
+            if entrada is not None:
+                heap.append(entrada)
+    heapq.heapify(heap)
+
+    while heap:
+        _, a, b = heapq.heappop(heap)
+        if a not in ativas or b not in ativas:
+            fusoes.pop((a, b), None)
+            continue
+        _, orientacao, custo_transporte = fusoes.pop((a, b))
+        r1, r2 = ativas[a], ativas[b]
+        if verbose:
+            posicoes = list(ativas)
+            i, j = posicoes.index(a), posicoes.index(b)
+
+        nova_rota = r1.juntar(r2, sequencia_fusao(r1, r2, deposito, orientacao), custo_transporte)
+        del ativas[a]
+        del ativas[b]
+        nova_id = proximo_id
+        proximo_id += 1
+        ativas[nova_id] = nova_rota
+        total_fusoes += 1
+        for k in ativas:
+            if k == nova_id:
+                continue
+            entrada = avaliar_par(k, nova_id)
+            if entrada is not None:
+                heapq.heappush(heap, entrada)
 
-    return novas_rotas
+        if verbose:
+            print(f"Refundiu rotas {i} e {j} -> total agora: {len(ativas)}")
 
-def grasp_rotas(clientes, deposito, distancias, capacidade, iteracoes=5, ganho_minimo=0.1):
+    if verbose:
+        print("Nenhuma fusão adicional possível, encerrando refusão.")
+
+    if instrumentacao is not None:
+        instrumentacao.contar("refusao.fusoes", total_fusoes)
+    return list(ativas.values())
+
+def _fim_fase(fase, inicio, rotas, distancias, tempos, instrumentacao):
+    # Fecha a fase iniciada em `inicio` e já emite o evento (o log mostra cada fase ao terminar);
+    # o custo da solução só é calculado se houver instrumentação, fora do tempo da fase seguinte
+    duracao = time.perf_counter() - inicio
+    if tempos is not None:
+        tempos[fase] = tempos.get(fase, 0.0) + duracao
+    if instrumentacao is not None:
+        custo = custo_solucao(rotas, distancias) if rotas is not None else None
+        instrumentacao.medir(fase, duracao)
+        instrumentacao.evento("fase", fase=fase, segundos=duracao, rotas=len(rotas) if rotas is not None else 0,
+                              custo=custo)
+    return time.perf_counter()
+
+def iteracao_grasp(tabela, deposito, distancias, capacidade, ganho_minimo, rng, vizinhos=None, tempos=None,
+                   instrumentacao=None, prazo=None, construtivo="savings", construcao_interrompivel=False,
+                   entre_rotas=None):
+    # `tempos` (opcional) acumula os segundos gastos em cada fase de FASES_GRASP.
+    # construtivo="savings": rotas unitárias em ordem aleatória fundidas pelo Clarke-Wright;
+    # construtivo="split": rota gigante aleatorizada dividida de forma ótima (sem o heap O(n²)).
+    # `entre_rotas` liga a busca entre rotas no lugar de realocação + refusão; por padrão só
+    # depois do split (as rotas do savings já saem quase cheias e a busca quase não rende).
+    # O prazo sempre interrompe a busca local (a solução continua válida); a construção só é
+    # interrompida com `construcao_interrompivel` (já há incumbente) e, nesse caso, a iteração
+    # é descartada: devolve (None, inf).
+    prazo_construcao = prazo if construcao_interrompivel else None
+    inicio = time.perf_counter()
+    if construtivo == "split":
+        gigante = rota_gigante(tabela, deposito, distancias, rng, prazo=prazo_construcao)
+        if gigante is None:
+            return None, float('inf')
+        # A rota gigante ainda não é solução: a fase fica sem rotas nem custo
+        inicio = _fim_fase("construcao", inicio, None, distancias, tempos, instrumentacao)
+        rotas = dividir_rota(tabela, deposito, distancias, capacidade, *gigante)
+        inicio = _fim_fase("split", inicio, rotas, distancias, tempos, instrumentacao)
+    else:
+        ordem = list(range(len(tabela)))
+        rng.shuffle(ordem)
+        rotas = inicializar_rotas(tabela, deposito, distancias, ordem)
+        inicio = _fim_fase("construcao", inicio, rotas, distancias, tempos, instrumentacao)
+        rotas = juntar_rotas_com_heap(rotas, distancias, deposito, capacidade, ganho_minimo, instrumentacao,
+                                      prazo_construcao)
+        if rotas is None:
+            return None, float('inf')
+        inicio = _fim_fase("savings", inicio, rotas, distancias, tempos, instrumentacao)
+    if entre_rotas is None:
+        entre_rotas = construtivo == "split"
+    if entre_rotas:
+        # A busca entre rotas trabalha sobre os blocos de serviço deixados pela construção; o 2-opt
+        # vem depois porque pode separar as pontas de um serviço
+        rotas = busca_entre_rotas(rotas, distancias, deposito, capacidade, ganho_minimo, instrumentacao, prazo,
+                                  vizinhos)
+        inicio = _fim_fase("entre_rotas", inicio, rotas, distancias, tempos, instrumentacao)
+    rotas = aplicar_2opt_em_todas_rotas(rotas, distancias, max_iter=20, verbose=False, vizinhos=vizinhos,
+                                        instrumentacao=instrumentacao, prazo=prazo)
+    inicio = _fim_fase("2opt", inicio, rotas, distancias, tempos, instrumentacao)
+    if not entre_rotas:
+        rotas = realocar_rotas_pequenas(rotas, capacidade, distancias, deposito, vizinhos=vizinhos,
+                                        instrumentacao=instrumentacao)
+        inicio = _fim_fase("realocacao", inicio, rotas, distancias, tempos, instrumentacao)
+        rotas = refundir_rotas(rotas, distancias, deposito, capacidade, ganho_minimo,
+                               instrumentacao=instrumentacao)
+        _fim_fase("refusao", inicio, rotas, distancias, tempos, instrumentacao)
+    custo_atual = custo_solucao(rotas, distancias)
+    return rotas, custo_atual
+
+def _exigir_parada(iteracoes, tempo_limite, max_sem_melhora):
+    if iteracoes is None and tempo_limite is None and max_sem_melhora is None:
+        raise ValueError("iteracoes=None exige tempo_limite ou max_sem_melhora")
+
+def rng_iteracao(semente, iteracao):
+    if semente is None:
+        return random.Random()
+    return random.Random(semente + iteracao)
+
+def preparar_vizinhos(clientes, deposito, distancias, tamanho_vizinhanca):
+    if not tamanho_vizinhanca:
+        return None
+    return vizinhos_mais_proximos(distancias, tamanho_vizinhanca, terminais_clientes(clientes, deposito))
+
+def grasp_rotas(clientes, deposito, distancias, capacidade, iteracoes=5, ganho_minimo=0.1, semente=None,
+                tamanho_vizinhanca=None, tempos=None, instrumentacao=None, tempo_limite=None,
+                max_sem_melhora=None, medida_tempo="parede", ao_melhorar=None, construtivo="savings",
+                entre_rotas=None):
+    # `construtivo` escolhe a construção de cada iteração (um de CONSTRUTIVOS) e `entre_rotas`
+    # a busca local que vem depois (ver iteracao_grasp).
+    # Modo anytime: com `tempo_limite` (segundos) as iterações param no prazo, a busca
+    # local da iteração corrente é interrompida e uma construção cortada pelo prazo é
+    # descartada; `iteracoes=None` roda até o prazo ou até `max_sem_melhora` iterações
+    # seguidas sem melhora. A primeira iteração sempre termina a construção, então sempre
+    # há solução. `ao_melhorar(rotas, custo, iteracao)` recebe cada nova incumbente.
+    if construtivo not in CONSTRUTIVOS:
+        raise ValueError(f"Construtivo desconhecido: {construtivo}")
+    _exigir_parada(iteracoes, tempo_limite, max_sem_melhora)
     melhor_solucao = None
     melhor_custo = float('inf')
-
-    for iter in range(iteracoes):
-        print(f"  ➤ GRASP iteração {iter+1} de {iteracoes}")
-        random.shuffle(clientes)
-        rotas = inicializar_rotas(clientes, deposito, distancias)
-        rotas = juntar_rotas_com_heap(rotas, distancias, deposito, capacidade, ganho_minimo)
-        rotas = aplicar_2opt_em_todas_rotas(rotas, distancias, max_iter=20, verbose=False)
-        rotas = realocar_rotas_pequenas(rotas, capacidade, distancias, deposito)
-        rotas = refundir_rotas(rotas, distancias, deposito, capacidade, ganho_minimo)
-        custo_atual = sum(custo_total_rota(r, distancias) for r in rotas)
+    tabela = TabelaServicos(clientes)
+    vizinhos = preparar_vizinhos(clientes, deposito, distancias, tamanho_vizinhanca)
+    prazo = Prazo(tempo_limite, medida_tempo) if tempo_limite is not None else None
+    sem_melhora = 0
+
+    for iter in (range(iteracoes) if iteracoes is not None else itertools.count()):
+        if melhor_solucao is not None:
+            if prazo is not None and prazo.esgotado():
+                break
+            if max_sem_melhora is not None and sem_melhora >= max_sem_melhora:
+                break
+        print(f"  ➤ GRASP iteração {iter+1}" + (f" de {iteracoes}" if iteracoes is not None else ""))
+        rotas, custo_atual = iteracao_grasp(tabela, deposito, distancias, capacidade, ganho_minimo,
+                                            rng_iteracao(semente, iter), vizinhos, tempos, instrumentacao,
+                                            prazo, construtivo, construcao_interrompivel=melhor_solucao is not None,
+                                            entre_rotas=entre_rotas)
+        if rotas is None:
+            # O prazo acabou no meio da construção: a iteração não conta
+            if instrumentacao is not None:
+                instrumentacao.contar("grasp.iteracoes_descartadas")
+            break
         if custo_atual < melhor_custo:
             melhor_custo = custo_atual
-            melhor_solucao = deepcopy(rotas)
+            # Cada iteração constrói rotas novas: guardar a referência basta
+            melhor_solucao = rotas
+            sem_melhora = 0
+            if ao_melhorar is not None:
+                ao_melhorar(melhor_solucao, melhor_custo, iter)
+        else:
+            sem_melhora += 1
+        if instrumentacao is not None:
+            instrumentacao.contar("grasp.iteracoes")
+            instrumentacao.evento("iteracao", iteracao=iter, custo=custo_atual, melhor_custo=melhor_custo)
 
     return melhor_solucao
+
+_contexto_worker = {}
+
+def _iniciar_worker_grasp(nome_memoria, forma, tipo, vertices, clientes, deposito, capacidade, ganho_minimo,
+                          tamanho_vizinhanca=None, construtivo="savings", entre_rotas=None):
+    memoria = shared_memory.SharedMemory(name=nome_memoria)
+    dist = np.ndarray(forma, dtype=tipo, buffer=memoria.buf)
+    distancias = MatrizDistancias(vertices, dist)
+    _contexto_worker.update(
+        memoria=memoria,
+        distancias=distancias,
+        vizinhos=preparar_vizinhos(clientes, deposito, distancias, tamanho_vizinhanca),
+        tabela=TabelaServicos(clientes),
+        deposito=deposito,
+        capacidade=capacidade,
+        ganho_minimo=ganho_minimo,
+        construtivo=construtivo,
+        entre_rotas=entre_rotas
+    )
+
+def _executar_iteracao_worker(semente, iteracao, segundos=None, medida_tempo="parede"):
+    ctx = _contexto_worker
+    prazo = Prazo(segundos, medida_tempo) if segundos is not None else None
+    return iteracao_grasp(ctx['tabela'], ctx['deposito'], ctx['distancias'], ctx['capacidade'],
+                          ctx['ganho_minimo'], rng_iteracao(semente, iteracao), ctx['vizinhos'], prazo=prazo,
+                          construtivo=ctx['construtivo'], construcao_interrompivel=iteracao > 0,
+                          entre_rotas=ctx['entre_rotas'])
+
+def _iteracoes_em_lotes(executor, semente, iteracoes, tamanho_lote, prazo, max_sem_melhora, medida_tempo):
+    # Lotes de `tamanho_lote` iterações; antes de cada lote checa o prazo (tempo de parede
+    # no processo principal) e a sequência de iterações sem melhora, na ordem das iterações
+    _exigir_parada(iteracoes, prazo, max_sem_melhora)
+    resultados = []
+    melhor_custo = float('inf')
+    sem_melhora = 0
+    contador = iter(range(iteracoes)) if iteracoes is not None else itertools.count()
+    while True:
+        if resultados:
+            if prazo is not None and prazo.esgotado():
+                break
+            if max_sem_melhora is not None and sem_melhora >= max_sem_melhora:
+                break
+        lote = list(itertools.islice(contador, tamanho_lote))
+        if not lote:
+            break
+        segundos = prazo.restante() if prazo is not None else None
+        futuros = [executor.submit(_executar_iteracao_worker, semente, it, segundos, medida_tempo)
+                   for it in lote]
+        for futuro in futuros:
+            rotas, custo = futuro.result()
+            if rotas is None:
+                # Construção cortada pelo prazo: a iteração não conta
+                continue
+            resultados.append((rotas, custo))
+            if custo < melhor_custo:
+                melhor_custo = custo
+                sem_melhora = 0
+            else:
+                sem_melhora += 1
+    return resultados
+
+def grasp_rotas_paralelo(clientes, deposito, distancias, capacidade, iteracoes=5, ganho_minimo=0.1,
+                         semente=0, workers=None, tamanho_vizinhanca=None, tempo_limite=None,
+                         max_sem_melhora=None, medida_tempo="parede", construtivo="savings",
+                         entre_rotas=None):
+    # A matriz de distâncias vai para memória compartilhada uma única vez; cada iteração
+    # usa seu próprio random.Random(semente + iteração), então o resultado é reproduzível
+    # (exceto quando o prazo corta iterações ou a busca local).
+    _exigir_parada(iteracoes, tempo_limite, max_sem_melhora)
+    dist = np.ascontiguousarray(distancias.dist)
+    memoria = shared_memory.SharedMemory(create=True, size=max(dist.nbytes, 1))
+    try:
+        np.ndarray(dist.shape, dtype=dist.dtype, buffer=memoria.buf)[:] = dist
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_iniciar_worker_grasp,
+            initargs=(memoria.name, dist.shape, dist.dtype, distancias.vertices,
+                      list(clientes), deposito, capacidade, ganho_minimo, tamanho_vizinhanca,
+                      construtivo, entre_rotas)
+        ) as executor:
+            if tempo_limite is None and max_sem_melhora is None:
+                resultados = list(executor.map(_executar_iteracao_worker,
+                                               [semente] * iteracoes, range(iteracoes)))
+            else:
+                prazo = Prazo(tempo_limite, "parede") if tempo_limite is not None else None
+                resultados = _iteracoes_em_lotes(executor, semente, iteracoes, workers or os.cpu_count() or 1,
+                                                 prazo, max_sem_melhora, medida_tempo)
+    finally:
+        memoria.close()
+        memoria.unlink()
+
+    custos_iteracoes = [custo for _, custo in resultados]
+    melhor = min(range(len(resultados)), key=lambda i: custos_iteracoes[i]) if resultados else None
+    melhor_solucao = resultados[melhor][0] if resultados else None
+    return melhor_solucao, custos_iteracoes
@@ -0,0 +1,163 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import time
+
+from algoritmo_construtivo import CONSTRUTIVOS, FASES_GRASP, custo_solucao, grasp_rotas, preparar_clientes
+from leitor_grafo import instancia_para_dados, ler_instancia
+from main import calcular_distancias_instancia
+from matriz_distancias import terminais_clientes
+
+# Subconjunto fixo e representativo: pequenas (mggdb/mgval), médias (BHW/CBMix) e grandes (DI-NEARP)
+INSTANCIAS_BENCHMARK = ("mggdb_0.25_1.dat", "mgval_0.30_5B.dat", "BHW10.dat", "CBMix13.dat",
+                        "DI-NEARP-n240-Q4k.dat", "DI-NEARP-n477-Q4k.dat")
+ETAPAS = ("leitura", "apsp") + FASES_GRASP + ("grasp",)
+TOLERANCIA_TEMPO = 0.25
+# Variações abaixo disso (em segundos) são ruído de medição, não regressão
+TEMPO_MINIMO_REGRESSAO = 0.02
+
+
+def medir_instancia(caminho, repeticoes=3, iteracoes=3, semente=0, tamanho_vizinhanca=None,
+                    construtivo="savings", entre_rotas=None):
+    if repeticoes < 1:
+        raise ValueError("repeticoes deve ser pelo menos 1")
+    leituras, apsps = [], []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        dados = instancia_para_dados(ler_instancia(caminho))
+        leituras.append(time.perf_counter() - inicio)
+
+        clientes = preparar_clientes(dados["vertices_requeridos"], dados["arestas_requeridas"],
+                                     dados["arcos_requeridos"])
+        capacidade = int(dados["header"]["Capacity"])
+        deposito = int(dados["header"]["Depot Node"])
+
+        # Mesmo caminho do main.py (redução + Dijkstra dos terminais em grafos esparsos), sem o cache
+        inicio = time.perf_counter()
+        distancias, _, _ = calcular_distancias_instancia(dados["vertices"], dados["arestas"], dados["arcos"],
+                                                         terminais_clientes(clientes, deposito),
+                                                         usar_cache=False)
+        apsps.append(time.perf_counter() - inicio)
+
+    execucoes = []
+    for _ in range(repeticoes):
+        tempos = {}
+        inicio = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            rotas = grasp_rotas(clientes, deposito, distancias, capacidade, iteracoes=iteracoes,
+                                semente=semente, tamanho_vizinhanca=tamanho_vizinhanca, tempos=tempos,
+                                construtivo=construtivo, entre_rotas=entre_rotas)
+        tempos["grasp"] = time.perf_counter() - inicio
+        tempos["custo"] = custo_solucao(rotas, distancias)
+        execucoes.append(tempos)
+
+    # Mediana das repetições; com semente fixa o custo é o mesmo em todas
+    resultado = {"leitura": statistics.median(leituras), "apsp": statistics.median(apsps),
+                 "servicos": len(clientes)}
+    for etapa in FASES_GRASP + ("grasp",):
+        resultado[etapa] = statistics.median(e.get(etapa, 0.0) for e in execucoes)
+    resultado["custo"] = execucoes[0]["custo"]
+    resultado["custos"] = [e["custo"] for e in execucoes]
+    return resultado
+
+
+def executar_benchmark(pasta_dados, instancias=INSTANCIAS_BENCHMARK, repeticoes=3, iteracoes=3, semente=0,
+                       tamanho_vizinhanca=None, construtivo="savings", entre_rotas=None):
+    resultados = {
+        "config": {"repeticoes": repeticoes, "iteracoes": iteracoes, "semente": semente,
+                   "vizinhanca": tamanho_vizinhanca, "construtivo": construtivo, "entre_rotas": entre_rotas},
+        "instancias": {}
+    }
+    for nome in instancias:
+        print(f"⏱️  {nome}")
+        resultados["instancias"][nome] = medir_instancia(os.path.join(pasta_dados, nome), repeticoes,
+                                                         iteracoes, semente, tamanho_vizinhanca, construtivo,
+                                                         entre_rotas)
+    return resultados
+
+
+def comparar_com_baseline(resultados, baseline, tolerancia_tempo=TOLERANCIA_TEMPO):
+    regressoes = []
+    if resultados["config"] != baseline.get("config"):
+        regressoes.append(("config", "-", f"configuração difere da baseline: {baseline.get('config')}"))
+    for nome, atual in resultados["instancias"].items():
+        base = baseline.get("instancias", {}).get(nome)
+        if base is None:
+            continue
+        for etapa in ETAPAS:
+            t_atual, t_base = atual.get(etapa), base.get(etapa)
+            if t_atual is None or t_base is None:
+                continue
+            if t_atual > t_base * (1 + tolerancia_tempo) and t_atual - t_base > TEMPO_MINIMO_REGRESSAO:
+                regressoes.append((nome, etapa, f"tempo {t_base:.3f}s -> {t_atual:.3f}s"))
+        if base.get("custo") is not None and atual["custo"] > base["custo"]:
+            regressoes.append((nome, "custo", f"custo {base['custo']} -> {atual['custo']}"))
+    return regressoes
+
+
+def imprimir_resultados(resultados):
+    print(f"{'instância':<24}" + "".join(f"{etapa:>12}" for etapa in ETAPAS) + f"{'custo':>10}")
+    for nome, r in resultados["instancias"].items():
+        print(f"{nome:<24}" + "".join(f"{r[etapa]:>12.4f}" for etapa in ETAPAS) + f"{int(r['custo']):>10}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark por fase do GRASP em um subconjunto fixo de dados/")
+    parser.add_argument("--dados", default="dados", help="pasta com as instâncias (padrão: dados)")
+    parser.add_argument("--instancias", nargs="+", default=list(INSTANCIAS_BENCHMARK),
+                        help="instâncias a medir (padrão: subconjunto representativo)")
+    parser.add_argument("--repeticoes", type=int, default=3, help="execuções com a mesma semente (padrão: 3)")
+    parser.add_argument("--iteracoes", type=int, default=3, help="iterações do GRASP por execução (padrão: 3)")
+    parser.add_argument("--semente", type=int, default=0, help="semente do GRASP (padrão: 0)")
+    parser.add_argument("--vizinhanca", type=int, default=None, help="tamanho das listas de vizinhos")
+    parser.add_argument("--construtivo", choices=CONSTRUTIVOS, default="savings",
+                        help="construção de cada iteração do GRASP (padrão: savings)")
+    parser.add_argument("--entre-rotas", action="store_true",
+                        help="busca entre rotas também depois do savings (o split sempre a usa)")
+    parser.add_argument("--saida", default="benchmark_resultados.json",
+                        help="arquivo de resultados (padrão: benchmark_resultados.json)")
+    parser.add_argument("--baseline", default="benchmark_baseline.json",
+                        help="resultados de referência para comparação (padrão: benchmark_baseline.json)")
+    parser.add_argument("--salvar-baseline", action="store_true",
+                        help="grava os resultados atuais como nova baseline")
+    parser.add_argument("--tolerancia-tempo", type=float, default=TOLERANCIA_TEMPO,
+                        help="aumento relativo de tempo tolerado antes de acusar regressão (padrão: 0.25)")
+    args = parser.parse_args(argv)
+    if args.repeticoes < 1:
+        parser.error("--repeticoes deve ser pelo menos 1")
+
+    resultados = executar_benchmark(args.dados, args.instancias, args.repeticoes, args.iteracoes,
+                                    args.semente, args.vizinhanca, args.construtivo, args.entre_rotas or None)
+    imprimir_resultados(resultados)
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump(resultados, f, indent=2)
+    print(f"\n📄 Resultados salvos em: {args.saida}")
+
+    if args.salvar_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2)
+        print(f"📌 Baseline atualizada: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"Sem baseline em '{args.baseline}' (use --salvar-baseline para criar).")
+        return 0
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressoes = comparar_com_baseline(resultados, baseline, args.tolerancia_tempo)
+    if not regressoes:
+        print("✅ Sem regressões em relação à baseline.")
+        return 0
+    print("❌ Regressões encontradas:")
+    for nome, etapa, descricao in regressoes:
+        print(f"  ➤ {nome} [{etapa}]: {descricao}")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
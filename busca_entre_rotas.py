@@ -0,0 +1,311 @@
+import heapq
+
+import numpy as np
+
+from rota import Rota, avaliar_rotas
+
+# Movimentos entre duas rotas
+REALOCAR, TROCAR, DOIS_OPT_ESTRELA = "realocacao", "troca", "2opt*"
+# Posições em RotaBlocos.nos: pontas das folgas e dos blocos
+ANTES, DEPOIS = slice(0, None, 2), slice(1, None, 2)
+ENTRADAS, SAIDAS = slice(1, -1, 2), slice(2, None, 2)
+
+
+def _distancias(distancias, i, j):
+    # float64 com INF: ganhos indefinidos (INF - INF) nunca passam do mínimo
+    return np.asarray(distancias.valores(i, j), dtype=np.float64)
+
+
+class RotaBlocos:
+    # Rota como sequência de blocos de serviço (entrada, saída), com os custos em cache que
+    # deixam cada movimento em O(1). `nos` são os índices na matriz de [depósito, e0, s0, ..., depósito]:
+    # o bloco i entra na posição 1 + 2i e sai em 2 + 2i, e a folga g (antes do bloco g; g = k é a
+    # volta ao depósito) liga a posição 2g à 2g + 1. Assim entradas, saídas e as duas pontas das
+    # folgas são fatias de passo 2 (ANTES, DEPOIS, ENTRADAS, SAIDAS), sem indexação avançada.
+    __slots__ = ('rota', 'servicos', 'pontas', 'nos', 'invertivel', 'demandas', 'acumulada', 'demanda',
+                 'folga', 'percurso', 'percurso_inverso', 'ocupado', 'saida', 'prefixo', 'sufixo', 'custo')
+
+    def __init__(self, rota, tabela, servicos, pontas, distancias, deposito):
+        self.rota = rota
+        self.servicos = servicos
+        self.pontas = pontas
+        indice = distancias.indice
+        nos = np.fromiter((indice[v] for v in [deposito] + pontas + [deposito]), dtype=np.intp,
+                          count=len(pontas) + 2)
+        self.nos = nos
+        self.invertivel = np.array([tabela.tipo[s] == 'e' for s in servicos], dtype=bool)
+        self.demandas = np.array([tabela.demanda[s] for s in servicos], dtype=np.int64)
+        self.acumulada = np.concatenate(([0], np.cumsum(self.demandas)))
+        self.demanda = int(self.acumulada[-1])
+
+        self.folga = _distancias(distancias, nos[ANTES], nos[DEPOIS])
+        self.percurso = _distancias(distancias, nos[ENTRADAS], nos[SAIDAS])
+        self.percurso_inverso = _distancias(distancias, nos[SAIDAS], nos[ENTRADAS])
+        # Trecho ocupado pelo bloco i (folgas dos dois lados) e o que sobra quando ele sai,
+        # com as duas folgas trocadas por um atalho
+        self.ocupado = self.folga[:-1] + self.percurso + self.folga[1:]
+        self.saida = self.ocupado - _distancias(distancias, nos[ANTES][:-1], nos[DEPOIS][1:])
+        self.prefixo = np.concatenate(([0], np.cumsum(self.folga[:-1] + self.percurso)))
+        self.custo = self.prefixo[-1] + self.folga[-1]
+        self.sufixo = self.custo - self.prefixo - self.folga
+
+    def __len__(self):
+        return len(self.servicos)
+
+    def para_rota(self, tabela, deposito):
+        if self.rota is not None:
+            return self.rota
+        # O custo é recalculado em inteiros, não a partir dos prefixos em float64
+        return Rota(tabela, self.servicos, [deposito] + self.pontas + [deposito])
+
+
+def blocos_da_rota(rota, distancias, deposito):
+    # Lê a sequência como pares consecutivos (entrada, saída), um por serviço. Se ela não tiver
+    # essa forma (o 2-opt pode separar as pontas de um serviço), devolve None.
+    tabela = rota.tabela
+    seq = rota.sequencia
+    if len(seq) != 2 * len(rota.servicos) + 2 or seq[0] != deposito or seq[-1] != deposito:
+        return None
+    pendentes = {}
+    for s in rota.servicos:
+        o, d = tabela.origem[s], tabela.destino[s]
+        pendentes.setdefault((min(o, d), max(o, d)), []).append(s)
+
+    servicos = []
+    for p in range(1, len(seq) - 1, 2):
+        a, b = seq[p], seq[p + 1]
+        candidatos = pendentes.get((min(a, b), max(a, b)))
+        if not candidatos:
+            return None
+        servicos.append(candidatos.pop(0))
+    return RotaBlocos(rota, tabela, servicos, seq[1:-1], distancias, deposito)
+
+
+def _encaixes(destino, origem, d_do, d_od):
+    # Custo de cada bloco j de `origem` dentro de `destino`, na melhor orientação (só arestas
+    # invertem): em cada folga g (realocação, [j, g]) e no lugar do bloco i (troca, [j, i]).
+    # d_do: distâncias dos nós do destino aos da origem; d_od: o contrário.
+    chegada, partida = d_do[ANTES, ENTRADAS].T, d_od[SAIDAS, DEPOIS]
+    insercao = chegada + origem.percurso[:, None] + partida
+    no_lugar = chegada[:, :-1] + origem.percurso[:, None] + partida[:, 1:]
+    if not origem.invertivel.any():
+        return insercao, np.zeros(insercao.shape, dtype=bool), no_lugar, np.zeros(no_lugar.shape, dtype=bool)
+
+    chegada, partida = d_do[ANTES, SAIDAS].T, d_od[ENTRADAS, DEPOIS]
+    insercao_inversa = chegada + origem.percurso_inverso[:, None] + partida
+    no_lugar_inverso = chegada[:, :-1] + origem.percurso_inverso[:, None] + partida[:, 1:]
+    inv_insercao = origem.invertivel[:, None] & (insercao_inversa < insercao)
+    inv_lugar = origem.invertivel[:, None] & (no_lugar_inverso < no_lugar)
+    return (np.where(inv_insercao, insercao_inversa, insercao), inv_insercao,
+            np.where(inv_lugar, no_lugar_inverso, no_lugar), inv_lugar)
+
+
+def _melhor(ganhos, minimo, permitido=True):
+    # Posição do maior ganho permitido (a primeira, em empates), se ele passar do mínimo; ganhos
+    # indefinidos (INF - INF, sem caminho) nunca são escolhidos
+    if ganhos.size == 0:
+        return None
+    validos = np.where(permitido & (ganhos > minimo), ganhos, -np.inf)
+    k = int(np.argmax(validos))
+    ganho = validos.flat[k]
+    if not ganho > minimo:
+        return None
+    return float(ganho), tuple(int(x) for x in np.unravel_index(k, ganhos.shape))
+
+
+def _perto_das_folgas(perto):
+    # Bloco j (linhas) perto da folga g (colunas): alguma ponta do bloco é vizinha de alguma
+    # ponta da folga, ou seja, ao menos uma das ligações novas da inserção é curta
+    return perto[ENTRADAS, ANTES] | perto[ENTRADAS, DEPOIS] | perto[SAIDAS, ANTES] | perto[SAIDAS, DEPOIS]
+
+
+def avaliar_par(a, b, distancias, capacidade, minimo, proximos=None):
+    # Melhor movimento entre as rotas a e b: realocação (nos dois sentidos), troca ou 2-opt*.
+    # A capacidade é checada antes, nas demandas em cache: movimento sem nenhuma combinação
+    # viável (o comum entre rotas quase cheias, como as do savings) nem é avaliado. Com
+    # `proximos` (matriz_proximos), só entram movimentos com alguma ligação nova entre vizinhos.
+    # As distâncias entre os nós das duas rotas são lidas uma única vez (uma só se a matriz
+    # for simétrica); cada movimento é avaliado em O(1) a partir das folgas, prefixos e demandas.
+    sobra_a, sobra_b = capacidade - a.demanda, capacidade - b.demanda
+    perto = None
+    if proximos is not None:
+        # Rotas sem nenhum par de pontas de serviço vizinhas nem são comparadas (o depósito,
+        # vizinho de todos, não conta)
+        perto = proximos[a.nos[:, None], b.nos[None, :]]
+        if not perto[1:-1, 1:-1].any():
+            return None
+        a_perto_b, b_perto_a = _perto_das_folgas(perto), _perto_das_folgas(perto.T)
+
+    realocaveis = []
+    for origem, destino in ((a, b), (b, a)):
+        permitido = (origem.demandas <= capacidade - destino.demanda)[:, None]
+        if perto is not None:
+            permitido = permitido & (a_perto_b if origem is a else b_perto_a)
+        realocaveis.append(permitido if permitido.any() else None)
+    trocaveis = None
+    if len(a) and len(b):
+        diferenca = b.demandas[None, :] - a.demandas[:, None]
+        trocaveis = (diferenca <= sobra_a) & (-diferenca <= sobra_b)
+        if perto is not None:
+            trocaveis &= (a_perto_b[:, :-1] | a_perto_b[:, 1:] | (b_perto_a[:, :-1] | b_perto_a[:, 1:]).T)
+        if not trocaveis.any():
+            trocaveis = None
+    # 2-opt*: a[:i] + b[j:] e b[:j] + a[i:]; os dois cantos devolvem as mesmas rotas
+    cortes = ((a.acumulada[:, None] - b.acumulada[None, :] <= sobra_b)
+              & (b.acumulada[None, :] - a.acumulada[:, None] <= sobra_a))
+    cortes[0, 0] = cortes[-1, -1] = False
+    if perto is not None:
+        cortes &= perto[ANTES, DEPOIS] | perto[DEPOIS, ANTES]
+    if realocaveis[0] is None and realocaveis[1] is None and trocaveis is None and not cortes.any():
+        return None
+
+    d_ab = _distancias(distancias, a.nos[:, None], b.nos[None, :])
+    d_ba = d_ab.T if distancias.triangular else _distancias(distancias, b.nos[:, None], a.nos[None, :])
+    candidatos = []
+
+    # Realocação do bloco j da origem para a folga g do destino
+    no_lugar = []
+    for sentido, (origem, destino, d_do, d_od) in enumerate(((a, b, d_ba, d_ab), (b, a, d_ab, d_ba))):
+        if realocaveis[sentido] is None and trocaveis is None:
+            continue
+        insercao, invertido, lugar, inv_lugar = _encaixes(destino, origem, d_do, d_od)
+        no_lugar.append((lugar, inv_lugar))
+        if realocaveis[sentido] is None:
+            continue
+        ganhos = origem.saida[:, None] - (insercao - destino.folga[None, :])
+        achado = _melhor(ganhos, minimo, realocaveis[sentido])
+        if achado is not None:
+            j, g = achado[1]
+            candidatos.append((achado[0], REALOCAR, sentido, j, g, bool(invertido[j, g])))
+
+    # Troca do bloco i de a com o bloco j de b, cada um no lugar do outro
+    if trocaveis is not None:
+        (a_em_b, inv_a), (b_em_a, inv_b) = no_lugar
+        ganhos = (a.ocupado[:, None] - b_em_a.T) + (b.ocupado[None, :] - a_em_b)
+        achado = _melhor(ganhos, minimo, trocaveis)
+        if achado is not None:
+            i, j = achado[1]
+            candidatos.append((achado[0], TROCAR, i, j, bool(inv_a[i, j]), bool(inv_b[j, i])))
+
+    if cortes.any():
+        nova_a = a.prefixo[:, None] + d_ab[ANTES, DEPOIS] + b.sufixo[None, :]
+        nova_b = b.prefixo[None, :] + d_ba[ANTES, DEPOIS].T + a.sufixo[:, None]
+        ganhos = (a.custo + b.custo) - nova_a - nova_b
+        achado = _melhor(ganhos, minimo, cortes)
+        if achado is not None:
+            candidatos.append((achado[0], DOIS_OPT_ESTRELA) + achado[1])
+
+    # Empates entre movimentos: vale a ordem acima
+    return max(candidatos, key=lambda c: c[0], default=None)
+
+
+def matriz_proximos(distancias, vizinhos, deposito):
+    # Lista de candidatos granular: (u, v) é curta se um está entre os vizinhos do outro;
+    # ligações com o depósito sempre entram (começo e fim das rotas)
+    n = len(distancias.vertices)
+    indice = distancias.indice
+    proximos = np.zeros((n, n), dtype=bool)
+    pares = np.array([(indice[u], indice[v]) for u, lista in vizinhos.items() for v in lista],
+                     dtype=np.intp).reshape(-1, 2)
+    proximos[pares[:, 0], pares[:, 1]] = True
+    proximos[pares[:, 1], pares[:, 0]] = True
+    proximos[indice[deposito], :] = proximos[:, indice[deposito]] = True
+    return proximos
+
+
+def _bloco(rota, i, invertido):
+    e, s = rota.pontas[2 * i], rota.pontas[2 * i + 1]
+    return [s, e] if invertido else [e, s]
+
+
+def aplicar_movimento(a, b, movimento):
+    # Devolve (serviços, pontas) das duas rotas resultantes
+    tipo = movimento[1]
+    if tipo == REALOCAR:
+        _, _, sentido, j, g, invertido = movimento
+        origem, destino = (a, b) if sentido == 0 else (b, a)
+        nova_origem = (origem.servicos[:j] + origem.servicos[j + 1:],
+                       origem.pontas[:2 * j] + origem.pontas[2 * j + 2:])
+        novo_destino = (destino.servicos[:g] + [origem.servicos[j]] + destino.servicos[g:],
+                        destino.pontas[:2 * g] + _bloco(origem, j, invertido) + destino.pontas[2 * g:])
+        return (nova_origem, novo_destino) if sentido == 0 else (novo_destino, nova_origem)
+    if tipo == TROCAR:
+        _, _, i, j, inv_a, inv_b = movimento
+        nova_a = (a.servicos[:i] + [b.servicos[j]] + a.servicos[i + 1:],
+                  a.pontas[:2 * i] + _bloco(b, j, inv_b) + a.pontas[2 * i + 2:])
+        nova_b = (b.servicos[:j] + [a.servicos[i]] + b.servicos[j + 1:],
+                  b.pontas[:2 * j] + _bloco(a, i, inv_a) + b.pontas[2 * j + 2:])
+        return nova_a, nova_b
+    _, _, i, j = movimento
+    return ((a.servicos[:i] + b.servicos[j:], a.pontas[:2 * i] + b.pontas[2 * j:]),
+            (b.servicos[:j] + a.servicos[i:], b.pontas[:2 * j] + a.pontas[2 * i:]))
+
+
+def busca_entre_rotas(rotas, distancias, deposito, capacidade, ganho_minimo=0.1, instrumentacao=None,
+                      prazo=None, vizinhos=None):
+    # Busca local entre rotas pela melhor melhora: o melhor movimento de cada par de rotas fica
+    # num heap com remoção preguiçosa e, após um movimento, só os pares com as duas rotas
+    # alteradas são reavaliados. Rotas que esvaziam somem; rotas fora do formato de blocos
+    # (ver blocos_da_rota) ficam como estão. Com `vizinhos` (listas de k vizinhos, como no
+    # 2-opt), só são avaliados movimentos que criam alguma ligação entre vizinhos.
+    if not rotas:
+        return rotas
+    tabela = rotas[0].tabela
+    proximos = matriz_proximos(distancias, vizinhos, deposito) if vizinhos is not None else None
+    ativas = {}
+    fixas = []
+    for rota in rotas:
+        blocos = blocos_da_rota(rota, distancias, deposito)
+        if blocos is None:
+            fixas.append(rota)
+        else:
+            ativas[len(ativas)] = blocos
+    proximo_id = len(ativas)
+    heap = []
+    movimentos = {}
+    contagem = {REALOCAR: 0, TROCAR: 0, DOIS_OPT_ESTRELA: 0}
+    avaliacoes = 0
+
+    def avaliar(x, y):
+        nonlocal avaliacoes
+        avaliacoes += 1
+        movimento = avaliar_par(ativas[x], ativas[y], distancias, capacidade, ganho_minimo, proximos)
+        if movimento is not None:
+            movimentos[(x, y)] = movimento
+            heapq.heappush(heap, (-movimento[0], x, y))
+
+    # A varredura inicial é O(R²) avaliações: também para no prazo (o laço abaixo sai logo)
+    ids = list(ativas)
+    for p in range(len(ids)):
+        if prazo is not None and prazo.esgotado():
+            break
+        for q in range(p + 1, len(ids)):
+            avaliar(ids[p], ids[q])
+
+    while heap:
+        if prazo is not None and prazo.esgotado():
+            break
+        _, x, y = heapq.heappop(heap)
+        movimento = movimentos.pop((x, y), None)
+        if x not in ativas or y not in ativas or movimento is None:
+            continue
+        resultado = aplicar_movimento(ativas.pop(x), ativas.pop(y), movimento)
+        contagem[movimento[1]] += 1
+
+        novas = []
+        for servicos, pontas in resultado:
+            if servicos:
+                ativas[proximo_id] = RotaBlocos(None, tabela, servicos, pontas, distancias, deposito)
+                novas.append(proximo_id)
+                proximo_id += 1
+        for nova in novas:
+            for k in list(ativas):
+                if k != nova and not (k in novas and k > nova):
+                    avaliar(k, nova)
+
+    if instrumentacao is not None:
+        instrumentacao.contar("entre_rotas.realocacoes", contagem[REALOCAR])
+        instrumentacao.contar("entre_rotas.trocas", contagem[TROCAR])
+        instrumentacao.contar("entre_rotas.2opt_estrela", contagem[DOIS_OPT_ESTRELA])
+        instrumentacao.contar("entre_rotas.pares_avaliados", avaliacoes)
+    return avaliar_rotas([blocos.para_rota(tabela, deposito) for blocos in ativas.values()] + fixas, distancias)
@@ -0,0 +1,129 @@
+import hashlib
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+from matriz_distancias import MatrizDistancias, calcular_distancias, calcular_distancias_terminais, custos_efetivos
+
+PASTA_CACHE = "cache_distancias"
+LIMITE_CACHE_BYTES = 2 * 1024 ** 3
+# Incrementar sempre que o cálculo das distâncias mudar (invalida o cache antigo)
+VERSAO_CACHE = 3
+# Matrizes mantidas no processo para instâncias irmãs (mesmo grafo, outros serviços)
+LIMITE_MEMORIA = 4
+_memoria = OrderedDict()
+
+
+def impressao_grafo(vertices, arestas, arcos):
+    # Identidade do grafo de deslocamento (EDGE/ARC, incluindo ReE/ReA), independente dos
+    # serviços e da ordem de leitura: instâncias da mesma família têm a mesma impressão
+    h = hashlib.sha1()
+    h.update(repr(sorted(vertices)).encode())
+    h.update(repr(sorted(custos_efetivos(arestas, arcos).items())).encode())
+    return h.hexdigest()
+
+
+def chave_instancia(vertices, arestas, arcos, terminais=None):
+    h = hashlib.sha1()
+    h.update(f"v{VERSAO_CACHE}".encode())
+    h.update(impressao_grafo(vertices, arestas, arcos).encode())
+    if terminais is not None:
+        h.update(b"TERM")
+        h.update(repr(sorted(set(terminais))).encode())
+    return h.hexdigest()
+
+
+def _caminhos(chave, pasta):
+    return os.path.join(pasta, f"{chave}.npy"), os.path.join(pasta, f"{chave}.vertices.npy")
+
+
+def carregar_cache(chave, pasta=PASTA_CACHE):
+    caminho_dist, caminho_vert = _caminhos(chave, pasta)
+    if not (os.path.exists(caminho_dist) and os.path.exists(caminho_vert)):
+        return None
+    try:
+        vertices = np.load(caminho_vert).tolist()
+        dist = np.load(caminho_dist, mmap_mode='r')
+    except (OSError, ValueError):
+        return None
+    n = len(vertices)
+    if dist.shape not in ((n, n), (n * (n + 1) // 2,)):
+        return None
+    # Marca o uso para a política de remoção (menos recentemente usado sai primeiro)
+    os.utime(caminho_dist)
+    return MatrizDistancias(vertices, dist)
+
+
+def _salvar_npy(caminho, array):
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, "wb") as f:
+        np.save(f, array)
+    os.replace(temporario, caminho)
+
+
+def salvar_cache(chave, distancias, pasta=PASTA_CACHE, limite_bytes=LIMITE_CACHE_BYTES):
+    os.makedirs(pasta, exist_ok=True)
+    caminho_dist, caminho_vert = _caminhos(chave, pasta)
+    _salvar_npy(caminho_vert, np.asarray(distancias.vertices, dtype=np.int64))
+    _salvar_npy(caminho_dist, np.ascontiguousarray(distancias.dist))
+    limpar_cache(pasta, limite_bytes, manter=chave)
+
+
+def limpar_cache(pasta=PASTA_CACHE, limite_bytes=LIMITE_CACHE_BYTES, manter=None):
+    if not os.path.isdir(pasta):
+        return
+    entradas = []
+    total = 0
+    for nome in os.listdir(pasta):
+        if not nome.endswith(".npy") or nome.endswith(".vertices.npy"):
+            continue
+        chave = nome[:-len(".npy")]
+        caminho_dist, caminho_vert = _caminhos(chave, pasta)
+        try:
+            tamanho = os.path.getsize(caminho_dist)
+            if os.path.exists(caminho_vert):
+                tamanho += os.path.getsize(caminho_vert)
+            entradas.append((os.path.getmtime(caminho_dist), chave, tamanho))
+        except OSError:
+            # Removido por outro processo durante a listagem
+            continue
+        total += tamanho
+
+    for _, chave, tamanho in sorted(entradas):
+        if total <= limite_bytes:
+            break
+        if chave == manter:
+            continue
+        for caminho in _caminhos(chave, pasta):
+            try:
+                os.remove(caminho)
+            except FileNotFoundError:
+                pass
+        total -= tamanho
+
+
+def criar_matriz_distancias_cache(vertices, arestas, arcos, terminais=None, pasta=PASTA_CACHE,
+                                  limite_bytes=LIMITE_CACHE_BYTES):
+    # Procura primeiro na memória do processo, depois em disco; só então calcula
+    vertices = list(vertices)
+    chave = chave_instancia(vertices, arestas, arcos, terminais)
+    distancias = _memoria.get(chave)
+    if distancias is not None:
+        _memoria.move_to_end(chave)
+        return distancias, True
+
+    acerto = True
+    distancias = carregar_cache(chave, pasta)
+    if distancias is None:
+        acerto = False
+        if terminais is None:
+            distancias = calcular_distancias(vertices, arestas, arcos)
+        else:
+            distancias = calcular_distancias_terminais(vertices, arestas, arcos, terminais)
+        salvar_cache(chave, distancias, pasta, limite_bytes)
+
+    _memoria[chave] = distancias
+    while len(_memoria) > LIMITE_MEMORIA:
+        _memoria.popitem(last=False)
+    return distancias, acerto
@@ -0,0 +1,100 @@
+import heapq
+from concurrent.futures import ProcessPoolExecutor
+
+from matriz_distancias import INF, lista_adjacencia
+
+
+def adjacencia_csr_conjuntos(vertices, arestas, arcos):
+    # CSR (listas Python) sobre os conjuntos de arestas/arcos; mesmas regras de
+    # lista_adjacencia para ligações repetidas (vale a última, arcos por cima de arestas)
+    vertices = sorted(vertices)
+    indice = {v: i for i, v in enumerate(vertices)}
+    adjacencia = lista_adjacencia(vertices, arestas, arcos)
+
+    inicio = [0]
+    destino = []
+    custo = []
+    for u in vertices:
+        for v, c in adjacencia[u]:
+            destino.append(indice[v])
+            custo.append(c)
+        inicio.append(len(destino))
+    return vertices, inicio, destino, custo
+
+
+def _dependencias_origem(s, inicio, destino, custo, acumulado):
+    # Brandes a partir de `s`: Dijkstra contando caminhos mínimos (sigma) e, na ordem
+    # inversa de fechamento, acumulando as dependências de cada vértice
+    n = len(inicio) - 1
+    dist = [INF] * n
+    sigma = [0] * n
+    preds = [[] for _ in range(n)]
+    fechado = [False] * n
+    ordem = []
+
+    dist[s] = 0
+    sigma[s] = 1
+    heap = [(0, s)]
+    while heap:
+        d, u = heapq.heappop(heap)
+        if fechado[u]:
+            continue
+        fechado[u] = True
+        ordem.append(u)
+        su = sigma[u]
+        for k in range(inicio[u], inicio[u + 1]):
+            v = destino[k]
+            nova = d + custo[k]
+            if nova < dist[v]:
+                dist[v] = nova
+                sigma[v] = su
+                preds[v] = [u]
+                heapq.heappush(heap, (nova, v))
+            elif nova == dist[v] and not fechado[v]:
+                sigma[v] += su
+                preds[v].append(u)
+
+    delta = [0.0] * n
+    for w in reversed(ordem):
+        coef = (1.0 + delta[w]) / sigma[w]
+        for u in preds[w]:
+            delta[u] += sigma[u] * coef
+        if w != s:
+            acumulado[w] += delta[w]
+
+
+def _intermediacao_origens(origens, inicio, destino, custo):
+    acumulado = [0.0] * (len(inicio) - 1)
+    for s in origens:
+        _dependencias_origem(s, inicio, destino, custo, acumulado)
+    return acumulado
+
+
+_csr_worker = None
+
+
+def _iniciar_worker(inicio, destino, custo):
+    global _csr_worker
+    _csr_worker = (inicio, destino, custo)
+
+
+def _executar_bloco(origens):
+    return _intermediacao_origens(origens, *_csr_worker)
+
+
+def intermediacao_brandes(vertices, arestas, arcos, workers=1):
+    # Intermediação exata (pares ordenados, todos os caminhos mínimos) em O(V·E log V)
+    vertices, inicio, destino, custo = adjacencia_csr_conjuntos(vertices, arestas, arcos)
+    n = len(vertices)
+    if workers is None or workers <= 1 or n < 2:
+        acumulado = _intermediacao_origens(range(n), inicio, destino, custo)
+    else:
+        # Blocos intercalados equilibram a carga; a soma segue a ordem dos blocos
+        blocos = [range(b, n, workers) for b in range(workers)]
+        acumulado = [0.0] * n
+        with ProcessPoolExecutor(max_workers=workers, initializer=_iniciar_worker,
+                                 initargs=(inicio, destino, custo)) as executor:
+            for parcial in executor.map(_executar_bloco, blocos):
+                for i, valor in enumerate(parcial):
+                    acumulado[i] += valor
+    return {v: acumulado[i] for i, v in enumerate(vertices)}
@@ -0,0 +1,95 @@
+from collections import deque
+
+import numpy as np
+
+from rota import Rota, avaliar_rotas
+
+
+def rota_gigante(tabela, deposito, distancias, rng, alfa=0.0, prazo=None):
+    # Vizinho mais próximo aleatorizado sobre as pontas dos serviços: a partir do depósito,
+    # sorteia o próximo serviço entre os de entrada a no máximo (1 + alfa) vezes a mais
+    # próxima, escolhendo também a orientação (arestas podem ser percorridas nos dois sentidos).
+    # Com alfa=0 só os empates são sorteados, o que já varia bastante (vizinhos a custo zero)
+    # e dá ao split rotas bem melhores que uma lista de candidatos de tamanho fixo.
+    # Devolve (servicos, pontas), com pontas = [e0, s0, e1, s1, ...], ou None se o `prazo`
+    # acabar antes de a rota ficar completa.
+    indice = distancias.indice
+    origens = np.array([indice[v] for v in tabela.origem], dtype=np.intp)
+    destinos = np.array([indice[v] for v in tabela.destino], dtype=np.intp)
+    aresta = np.array([t == 'e' for t in tabela.tipo], dtype=bool)
+
+    restantes = np.arange(len(tabela))
+    atual = indice[deposito]
+    servicos = []
+    pontas = []
+    while len(restantes):
+        if prazo is not None and prazo.esgotado():
+            return None
+        direto = np.asarray(distancias.valores(atual, origens[restantes]), dtype=np.float64)
+        inverso = np.where(aresta[restantes], distancias.valores(atual, destinos[restantes]), np.inf)
+        custo = np.minimum(direto, inverso)
+        lrc = np.flatnonzero(custo <= custo.min() * (1 + alfa))
+        p = int(lrc[rng.randrange(len(lrc))])
+
+        s = int(restantes[p])
+        if inverso[p] < direto[p]:
+            entrada, saida = tabela.destino[s], tabela.origem[s]
+        else:
+            entrada, saida = tabela.origem[s], tabela.destino[s]
+        servicos.append(s)
+        pontas.extend((entrada, saida))
+        atual = indice[saida]
+        restantes[p] = restantes[-1]
+        restantes = restantes[:-1]
+    return servicos, pontas
+
+
+def dividir_rota(tabela, deposito, distancias, capacidade, servicos, pontas):
+    # Split ótimo da rota gigante em rotas viáveis (frota ilimitada), em O(n).
+    # O custo da rota com os serviços i+1..j é a(i) + b(j): a(i) = d(depósito, e_{i+1}) +
+    # percurso_{i+1} - D[i+1] e b(j) = D[j] + d(s_j, depósito), com D o custo acumulado ao
+    # longo da rota gigante. Então p[j] = b(j) + min p[i] + a(i) sobre a janela de i em que
+    # a carga cabe, que só avança: o mínimo da janela fica numa deque monótona.
+    n = len(servicos)
+    if n == 0:
+        return []
+    indice = distancias.indice
+    nos = np.fromiter((indice[v] for v in pontas), dtype=np.intp, count=2 * n)
+    entradas, saidas = nos[0::2], nos[1::2]
+    dep = indice[deposito]
+
+    percurso = distancias.valores(entradas, saidas)
+    ligacao = distancias.valores(saidas[:-1], entradas[1:])
+    acumulado = np.concatenate(([0], np.cumsum(percurso) + np.concatenate(([0], np.cumsum(ligacao)))))
+    a = (distancias.valores(dep, entradas) + percurso - acumulado[1:]).tolist()
+    b = [0] + (acumulado[1:] + distancias.valores(saidas, dep)).tolist()
+    carga = [0]
+    for s in servicos:
+        carga.append(carga[-1] + tabela.demanda[s])
+
+    custo = [0] + [None] * n
+    anterior = [0] * (n + 1)
+    janela = deque()
+    for j in range(1, n + 1):
+        i = j - 1
+        chave = custo[i] + a[i]
+        while janela and custo[janela[-1]] + a[janela[-1]] >= chave:
+            janela.pop()
+        janela.append(i)
+        while len(janela) > 1 and carga[j] - carga[janela[0]] > capacidade:
+            janela.popleft()
+        # Um serviço sozinho acima da capacidade ainda vira uma rota (como no savings)
+        melhor = janela[0]
+        if carga[j] - carga[melhor] > capacidade:
+            melhor = i
+        custo[j] = custo[melhor] + a[melhor] + b[j]
+        anterior[j] = melhor
+
+    rotas = []
+    j = n
+    while j > 0:
+        i = anterior[j]
+        rotas.append(Rota(tabela, servicos[i:j], [deposito] + pontas[2 * i:2 * j] + [deposito]))
+        j = i
+    rotas.reverse()
+    return avaliar_rotas(rotas, distancias)
@@ -6,127 +6,47 @@
 
 #*******************************************************************#
 
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-def leitor_arquivo(path):
-    try:
-        with open(path, "r", encoding="utf-8") as arquivo:
-            linhas = arquivo.readlines()
-    except FileNotFoundError:
-        print(f"Erro: Arquivo '{path}' não encontrado.")
-        exit()
-    except Exception as e:
-        print(f"Erro ao ler o arquivo: {e}")
-        exit()
-
-    vertices = set()
-    arestas = set()
-    arcos = set()
-    vertices_requeridos = set()
-    arestas_requeridas = set()
-    arcos_requeridos = set()
-    secao_atual = None
-
-    for linha in linhas:
-        linha = linha.strip()
-
-        # Ignora linhas vazias ou comentários
-        if not linha or linha.startswith("//") or linha.startswith("Name:"):
-            continue
-
-        # Identifica a seção atual com base no prefixo
-        if linha.startswith("ReN."):
-            secao_atual = "ReN"
-            continue
-        elif linha.startswith("ReE."):
-            secao_atual = "ReE"
-            continue
-        elif linha.startswith("EDGE"):
-            secao_atual = "EDGE"
-            continue
-        elif linha.startswith("ReA."):
-            secao_atual = "ReA"
-            continue
-        elif linha.startswith("ARC"):
-            secao_atual = "ARC"
-            continue
-
-        if linha and secao_atual:
-            partes = linha.split("\t")
-            try:
-                if secao_atual == "ReN":
-                    vertice = int(partes[0].replace("N", ""))
-                    demanda = int(partes[1])
-                    custo_servico = int(partes[2])
-                    vertices_requeridos.add((vertice, (demanda, custo_servico)))
-                    vertices.add(vertice)
-
-                elif secao_atual in ["ReE", "EDGE"]:
-                    origem, destino = int(partes[1]), int(partes[2])
-                    vertices.update([origem, destino])
-                    aresta = (min(origem, destino), max(origem, destino))
-                    custo_transporte = int(partes[3])
-                    arestas.add((aresta, custo_transporte))
-
-                    if secao_atual == "ReE":
-                        demanda = int(partes[4])
-                        custo_servico = int(partes[5])
-                        arestas_requeridas.add((aresta, (custo_transporte, demanda, custo_servico)))
-
-                elif secao_atual in ["ReA", "ARC"]:
-                    origem, destino = int(partes[1]), int(partes[2])
-                    vertices.update([origem, destino])
-                    arco = (origem, destino)
-                    custo_transporte = int(partes[3])
-                    arcos.add((arco, custo_transporte))
-
-                    if secao_atual == "ReA":
-                        demanda = int(partes[4])
-                        custo_servico = int(partes[5])
-                        arcos_requeridos.add((arco, (custo_transporte, demanda, custo_servico)))
-            except ValueError:
-                print(f"Erro ao processar linha: {linha}")
-                continue
-
-    if not vertices:
-        print("Erro: Nenhum vértice encontrado no arquivo.")
-        exit()
-
-    return vertices, arestas, arcos, vertices_requeridos, arestas_requeridas, arcos_requeridos
-
+import numpy as np
 
-def validar_grafo(vertices, arestas, arcos):
-    for (u, v), _ in arestas:
-        if u not in vertices or v not in vertices:
-            print(f"Erro: Aresta ({u}, {v}) contém vértices inexistentes.")
-            exit()
+from centralidade import intermediacao_brandes
+from leitor_grafo import ErroLeitura, instancia_para_dados, ler_instancia
+from matriz_distancias import calcular_distancias
 
-    for (u, v), _ in arcos:
-        if u not in vertices or v not in vertices:
-            print(f"Erro: Arco ({u}, {v}) contém vértices inexistentes.")
-            exit()
+CAMPOS_ESTATISTICAS = ("instancia", "vertices", "arestas", "arcos", "vertices_requeridos",
+                       "arestas_requeridas", "arcos_requeridos", "densidade", "diametro",
+                       "caminho_medio", "grau_minimo", "grau_maximo", "tempo", "erro")
 
-    print("Grafo validado com sucesso.")
 
+def leitor_arquivo(path):
+    # Mesmo leitor do roteamento (sem exit(): erros viram ErroLeitura)
+    dados = instancia_para_dados(ler_instancia(path))
+    return (dados["vertices"], dados["arestas"], dados["arcos"], dados["vertices_requeridos"],
+            dados["arestas_requeridas"], dados["arcos_requeridos"])
 
-def calcula_graus(vertices, arestas, arcos):
-    grausT = {v: [0, 0, 0] for v in vertices}  # [grau, entrada, saída]
 
+def validar_grafo(vertices, arestas, arcos):
     for (u, v), _ in arestas:
-        grausT[u][0] += 1
-        grausT[v][0] += 1
+        if u not in vertices or v not in vertices:
+            raise ValueError(f"Aresta ({u}, {v}) contém vértices inexistentes.")
 
     for (u, v), _ in arcos:
-        grausT[u][2] += 1  # saída
-        grausT[v][1] += 1  # entrada
-
-    return tuple((v, tuple(g)) for v, g in grausT.items())
+        if u not in vertices or v not in vertices:
+            raise ValueError(f"Arco ({u}, {v}) contém vértices inexistentes.")
 
 
-def imprimir_graus(graus):
-    grau_min = min(sum(g[1]) for g in graus)
-    grau_max = max(sum(g[1]) for g in graus)
-    print(f"Grau mínimo: {grau_min}")
-    print(f"Grau máximo: {grau_max}")
+def graus_totais(vertices, arestas, arcos):
+    # Grau total (arestas + entrada + saída) por vértice, na ordem de `vertices`
+    indice = {v: i for i, v in enumerate(vertices)}
+    extremos = [indice[u] for (u, v), _ in arestas] + [indice[v] for (u, v), _ in arestas]
+    extremos += [indice[u] for (u, v), _ in arcos] + [indice[v] for (u, v), _ in arcos]
+    return np.bincount(np.array(extremos, dtype=np.int64), minlength=len(vertices))
 
 
 def calcular_densidade(num_vertices, num_arestas, num_arcos):
@@ -137,42 +57,13 @@ def calcular_densidade(num_vertices, num_arestas, num_arcos):
     if arestasT == 0 or arcosT == 0:  # Densidade não definida para arestas ou arcos zero
         return 0
     if num_arestas > arestasT or num_arcos > arcosT:  # Limite de arestas e arcos
-        print("Erro: O número de arestas ou arcos excede o máximo permitido.")
-        exit()
+        raise ValueError("O número de arestas ou arcos excede o máximo permitido.")
     return (num_arestas + num_arcos) / (arestasT + arcosT)
 
 
 def floyd_warshall(vertices, arestas, arcos):
-    # Inicializa as matrizes de distâncias e predecessores
-    distancias = {v: {u: float('inf') for u in vertices} for v in vertices}
-    predecessores = {v: {u: None for u in vertices} for v in vertices}
-
-    # Define a distância de um vértice para ele mesmo como 0
-    for v in vertices:
-        distancias[v][v] = 0
-
-    # Adiciona as distâncias das arestas
-    for (u, v), custo in arestas:
-        distancias[u][v] = custo
-        distancias[v][u] = custo
-        predecessores[u][v] = u
-        predecessores[v][u] = v
-
-    # Adiciona as distâncias dos arcos
-    for (u, v), custo in arcos:
-        distancias[u][v] = custo
-        predecessores[u][v] = u
-
-    # Aplica o algoritmo de Floyd-Warshall
-
-    for k in vertices:
-        for i in vertices:
-            for j in vertices:
-                if distancias[i][j] > distancias[i][k] + distancias[k][j]:
-                    distancias[i][j] = distancias[i][k] + distancias[k][j]
-                    predecessores[i][j] = predecessores[k][j]
-
-    return distancias, predecessores
+    # Distâncias e predecessores em matrizes numpy, acessíveis como dict-de-dicts
+    return calcular_distancias(vertices, arestas, arcos, com_predecessores=True)
 
 
 def criar_matriz_distancias(vertices, arestas, arcos):
@@ -185,93 +76,160 @@ def criar_matriz_predecessores(vertices, arestas, arcos):
     return predecessores
 
 
-def caminho_minimo(matriz_pred, origem, destino):
-    caminho = []
-    atual = destino
-    while atual is not None:
-        caminho.insert(0, atual)
-        if atual == origem:  # Caminho completo
-            break
-        atual = matriz_pred[origem].get(atual)
-    if caminho[0] != origem:  # Verifica se o caminho é válido
-        return []  # Retorna um caminho vazio se não houver conexão
-    return caminho
+def distancias_finitas(matriz_dist):
+    # Distâncias de todos os pares alcançáveis (inclui a diagonal zero), num vetor só
+    dist = matriz_dist.densa()
+    return dist[np.isfinite(dist)]
 
 
-def calcular_diametro(matriz_dist):
-    diametro = 0
-    for d in matriz_dist.values():
-        dist_max = max(v for v in d.values() if v < float('inf'))
-        diametro = max(diametro, dist_max)
-    return diametro
+def calcular_diametro(finitas):
+    return int(finitas.max()) if finitas.size else 0
 
 
-def calcular_caminho_medio(num_vertices, matriz_dist):
-    soma = 0
-    count = 0
-    for linha in matriz_dist.values():
-        for valor in linha.values():
-            if valor < float('inf'):
-                soma += valor
-
-    return soma / (num_vertices * (num_vertices - 1))
-
-
-def calcular_intermediacao(vertices, matriz_pred):
-    intermediacao = {v: 0 for v in vertices}
-    for origem in vertices:
-        for destino in vertices:
-            if origem != destino:
-                caminho = caminho_minimo(matriz_pred, origem, destino)
-                if len(caminho) > 1:  # Verifica se existe um caminho válido
-                    for v in caminho[1:-1]:  # Exclui origem e destino
-                        intermediacao[v] += 1
-    return intermediacao
+def calcular_caminho_medio(num_vertices, finitas):
+    if num_vertices < 2:
+        return 0
+    return float(finitas.sum()) / (num_vertices * (num_vertices - 1))
+
+
+def calcular_intermediacao(vertices, arestas, arcos, workers=1):
+    # Brandes sobre a lista de adjacência: considera todos os caminhos mínimos de cada par
+    return intermediacao_brandes(vertices, arestas, arcos, workers)
+
+
+def calcular_metricas(vertices, arestas, arcos, vertices_req, arestas_req, arcos_req,
+                     com_predecessores=False, com_intermediacao=True, workers=1):
+    # Uma única execução de Floyd–Warshall (e uma única expansão densa) alimenta diâmetro e caminho médio
+    validar_grafo(vertices, arestas, arcos)
+    if com_predecessores:
+        matriz_dist, matriz_pred = floyd_warshall(vertices, arestas, arcos)
+    else:
+        matriz_dist = calcular_distancias(vertices, arestas, arcos)
+    graus = graus_totais(matriz_dist.vertices, arestas, arcos)
+    finitas = distancias_finitas(matriz_dist)
+
+    metricas = {
+        "vertices": len(vertices),
+        "arestas": len(arestas),
+        "arcos": len(arcos),
+        "vertices_requeridos": len(vertices_req),
+        "arestas_requeridas": len(arestas_req),
+        "arcos_requeridos": len(arcos_req),
+        "densidade": calcular_densidade(len(vertices), len(arestas), len(arcos)),
+        "diametro": calcular_diametro(finitas),
+        "caminho_medio": calcular_caminho_medio(len(vertices), finitas),
+        "grau_minimo": int(graus.min()) if graus.size else 0,
+        "grau_maximo": int(graus.max()) if graus.size else 0,
+        "distancias": matriz_dist,
+    }
+    if com_intermediacao:
+        metricas["intermediacao"] = calcular_intermediacao(vertices, arestas, arcos, workers)
+    if com_predecessores:
+        metricas["predecessores"] = matriz_pred
+    return metricas
 
 
 def exibirDados(vertices, arestas, arcos, vertices_req, arestas_req, arcos_req):
     try:
-        validar_grafo(vertices, arestas, arcos)
-        print("                             ")
-        print("**** Dados do Grafo ****")
-        print(f"Total de vértices: {len(vertices)}")
-        print(f"Total de arestas: {len(arestas)}")
-        print(f"Total de arcos: {len(arcos)}")
-        print(f"Vértices requeridos: {len(vertices_req)}")
-        print(f"Arestas requeridas: {len(arestas_req)}")
-        print(f"Arcos requeridos: {len(arcos_req)}")
-
-        densidade = calcular_densidade(len(vertices), len(arestas), len(arcos))
-        print(f"Densidade do grafo: {densidade:.4f}")
-
-        matriz_dist = criar_matriz_distancias(vertices, arestas, arcos)
-        matriz_pred = criar_matriz_predecessores(vertices, arestas, arcos)
-
-        diametro = calcular_diametro(matriz_dist)
-        print(f"Diâmetro do grafo: {diametro}")
-
-        caminho_medio = calcular_caminho_medio(len(vertices), matriz_dist)
-        print(f"Caminho médio: {caminho_medio:.4f}")
-
-        intermediacao = calcular_intermediacao(vertices, matriz_pred)
-        graus = calcula_graus(vertices, arestas, arcos)
-
-        imprimir_graus(graus)
-        print("                             ")
-        print("**** Intermediação por vértice ****")
-        for v, valor in intermediacao.items():
-            print(f"Vértice ({v}): {valor}")
+        metricas = calcular_metricas(vertices, arestas, arcos, vertices_req, arestas_req, arcos_req)
     except Exception as e:
         print(f"Erro ao calcular métricas: {e}")
-        exit()
-
-
-# Main Frame
-try:
-    path = input("Informe o caminho do arquivo .dat para leitura do grafo: ")
-    if not path.endswith(".dat"):
-        raise ValueError("O arquivo deve ter a extensão .dat.")
-    vertices, arestas, arcos, vertices_req, arestas_req, arcos_req = leitor_arquivo(path)
-    exibirDados(vertices, arestas, arcos, vertices_req, arestas_req, arcos_req)
-except Exception as e:
-    print(f"Erro durante a execução: {e}")
\ No newline at end of file
+        return None
+
+    print("Grafo validado com sucesso.")
+    print("                             ")
+    print("**** Dados do Grafo ****")
+    print(f"Total de vértices: {metricas['vertices']}")
+    print(f"Total de arestas: {metricas['arestas']}")
+    print(f"Total de arcos: {metricas['arcos']}")
+    print(f"Vértices requeridos: {metricas['vertices_requeridos']}")
+    print(f"Arestas requeridas: {metricas['arestas_requeridas']}")
+    print(f"Arcos requeridos: {metricas['arcos_requeridos']}")
+    print(f"Densidade do grafo: {metricas['densidade']:.4f}")
+    print(f"Diâmetro do grafo: {metricas['diametro']}")
+    print(f"Caminho médio: {metricas['caminho_medio']:.4f}")
+    print(f"Grau mínimo: {metricas['grau_minimo']}")
+    print(f"Grau máximo: {metricas['grau_maximo']}")
+    print("                             ")
+    print("**** Intermediação por vértice ****")
+    for v, valor in metricas['intermediacao'].items():
+        print(f"Vértice ({v}): {valor}")
+    return metricas
+
+
+def estatisticas_instancia(caminho):
+    # Linha de estatísticas (sem intermediação) de uma instância; erros ficam na coluna "erro"
+    inicio = time.time()
+    linha = {"instancia": os.path.basename(caminho)}
+    try:
+        metricas = calcular_metricas(*leitor_arquivo(caminho), com_intermediacao=False)
+    except (ErroLeitura, ValueError) as e:
+        linha["erro"] = str(e)
+    else:
+        linha.update({campo: metricas[campo] for campo in CAMPOS_ESTATISTICAS if campo in metricas})
+    linha["tempo"] = round(time.time() - inicio, 4)
+    return linha
+
+
+def estatisticas_lote(caminhos, workers=1):
+    # Resultados na ordem de `caminhos`; em paralelo, os maiores arquivos começam primeiro
+    if workers <= 1:
+        return [estatisticas_instancia(c) for c in caminhos]
+
+    linhas = [None] * len(caminhos)
+    ordem = sorted(range(len(caminhos)), key=lambda i: os.path.getsize(caminhos[i]), reverse=True)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futuros = {executor.submit(estatisticas_instancia, caminhos[i]): i for i in ordem}
+        for futuro in as_completed(futuros):
+            linhas[futuros[futuro]] = futuro.result()
+    return linhas
+
+
+def salvar_estatisticas(linhas, caminho):
+    if caminho.endswith(".json"):
+        with open(caminho, "w", encoding="utf-8") as f:
+            json.dump(linhas, f, ensure_ascii=False, indent=2)
+        return
+    with open(caminho, "w", encoding="utf-8", newline="") as f:
+        escritor = csv.DictWriter(f, fieldnames=CAMPOS_ESTATISTICAS)
+        escritor.writeheader()
+        escritor.writerows(linhas)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Estatísticas dos grafos das instâncias .dat")
+    parser.add_argument("entrada", nargs="?", default="dados",
+                        help="arquivo .dat (exibe as métricas) ou pasta (lote; padrão: dados)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="processos para o lote (padrão: número de CPUs)")
+    parser.add_argument("--saida", default="estatisticas.csv",
+                        help="arquivo de saída do lote, .csv ou .json (padrão: estatisticas.csv)")
+    args = parser.parse_args(argv)
+
+    if os.path.isfile(args.entrada):
+        if not args.entrada.endswith(".dat"):
+            print("Erro: O arquivo deve ter a extensão .dat.")
+            return
+        try:
+            dados = leitor_arquivo(args.entrada)
+        except ErroLeitura as e:
+            print(f"Erro durante a execução: {e}")
+            return
+        exibirDados(*dados)
+        return
+
+    if not os.path.isdir(args.entrada):
+        print(f"Erro: '{args.entrada}' não foi encontrado.")
+        return
+
+    caminhos = [os.path.join(args.entrada, f) for f in sorted(os.listdir(args.entrada)) if f.endswith(".dat")]
+    inicio = time.time()
+    linhas = estatisticas_lote(caminhos, args.workers)
+    salvar_estatisticas(linhas, args.saida)
+    falhas = sum(1 for linha in linhas if linha.get("erro"))
+    print(f"{len(linhas)} instâncias em {time.time() - inicio:.2f}s ({falhas} com erro). "
+          f"Estatísticas salvas em: {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import argparse
+import json
+import mmap
+import os
+
+import numpy as np
+
+from leitor_grafo import (
+    SERVICO_ARCO,
+    SERVICO_ARESTA,
+    Cabecalho,
+    ErroLeitura,
+    Instancia,
+    instancia_para_dados,
+    ler_instancia
+)
+from matriz_distancias import MatrizDistancias, calcular_distancias
+
+# Layout: MAGICO | tamanho dos metadados (uint64) | metadados JSON | arrays alinhados em 64 bytes.
+# Os metadados guardam o cabeçalho e, para cada array, dtype, forma e deslocamento.
+# Só vão para o arquivo as colunas que a carga usa (arrays extras de arquivos antigos são ignorados).
+MAGICO = b"CARPBIN1"
+EXTENSAO = ".cbin"
+ALINHAMENTO = 64
+
+COLUNAS_INSTANCIA = ('arestas_u', 'arestas_v', 'arestas_custo', 'arestas_requerida',
+                     'arcos_u', 'arcos_v', 'arcos_custo', 'arcos_requerida', 'servicos_tipo', 'servicos_origem', 'servicos_destino', 'servicos_demanda',
+                     'servicos_custo', 'servicos_transporte')
+
+
+def _alinhar(n):
+    return (n + ALINHAMENTO - 1) // ALINHAMENTO * ALINHAMENTO
+
+
+def salvar_binario(caminho, cabecalho, arrays):
+    arrays = {nome: np.ascontiguousarray(a) for nome, a in arrays.items()}
+    tabela = {}
+    deslocamento = 0
+    for nome, a in arrays.items():
+        tabela[nome] = [a.dtype.str, list(a.shape), deslocamento]
+        deslocamento = _alinhar(deslocamento + a.nbytes)
+    metadados = json.dumps({"cabecalho": cabecalho, "arrays": tabela}).encode("utf-8")
+    inicio_dados = _alinhar(len(MAGICO) + 8 + len(metadados))
+
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, "wb") as f:
+        f.write(MAGICO)
+        f.write(np.uint64(len(metadados)).tobytes())
+        f.write(metadados)
+        for nome, a in arrays.items():
+            f.seek(inicio_dados + tabela[nome][2])
+            f.write(a.tobytes())
+    os.replace(temporario, caminho)
+
+
+def ler_metadados(caminho):
+    with open(caminho, "rb") as f:
+        if f.read(len(MAGICO)) != MAGICO:
+            raise ErroLeitura(f"'{caminho}' não é uma instância compilada.")
+        tamanho = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+        return json.loads(f.read(tamanho).decode("utf-8")), _alinhar(len(MAGICO) + 8 + tamanho)
+
+
+def carregar_binario(caminho):
+    # Os arrays devolvidos são visões sobre o mmap do arquivo (sem cópia)
+    metadados, inicio_dados = ler_metadados(caminho)
+    with open(caminho, "rb") as f:
+        mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    arrays = {}
+    for nome, (tipo, forma, deslocamento) in metadados["arrays"].items():
+        tipo = np.dtype(tipo)
+        quantidade = int(np.prod(forma)) if forma else 1
+        a = np.frombuffer(mapa, dtype=tipo, count=quantidade, offset=inicio_dados + deslocamento)
+        arrays[nome] = a.reshape(forma)
+    return metadados["cabecalho"], arrays
+
+
+def compilar_instancia(caminho_dat, caminho_saida, com_distancias=False):
+    inst = ler_instancia(caminho_dat)
+    cabecalho = {"Name": inst.cabecalho.nome}
+    for chave, (atributo, _) in Cabecalho.CAMPOS.items():
+        valor = getattr(inst.cabecalho, atributo)
+        if valor is not None:
+            cabecalho[chave] = str(valor)
+
+    arrays = {nome: getattr(inst, nome) for nome in COLUNAS_INSTANCIA}
+
+    if com_distancias:
+        dados = instancia_para_dados(inst)
+        distancias = calcular_distancias(dados["vertices"], dados["arestas"], dados["arcos"])
+        arrays["dist_vertices"] = np.asarray(distancias.vertices, dtype=np.int64)
+        arrays["dist"] = distancias.dist
+
+    salvar_binario(caminho_saida, cabecalho, arrays)
+
+
+def carregar_instancia_binaria(caminho):
+    cabecalho, arrays = carregar_binario(caminho)
+    inst = Instancia()
+    inst.cabecalho = Cabecalho(cabecalho)
+    for nome in COLUNAS_INSTANCIA:
+        if nome in arrays:
+            setattr(inst, nome, arrays[nome])
+    # Arquivos compilados antes das colunas `*_requerida`: as linhas requeridas vinham primeiro
+    for prefixo, tipo in (("arestas", SERVICO_ARESTA), ("arcos", SERVICO_ARCO)):
+        if f"{prefixo}_requerida" not in arrays:
+            requeridas = int(np.count_nonzero(inst.servicos_tipo == tipo))
+            setattr(inst, f"{prefixo}_requerida", np.arange(len(getattr(inst, f"{prefixo}_u"))) < requeridas)
+
+    distancias = None
+    if "dist" in arrays:
+        distancias = MatrizDistancias(arrays["dist_vertices"].tolist(), arrays["dist"])
+    return inst, distancias
+
+
+def compilar_pasta(pasta_dados, pasta_saida, com_distancias=False):
+    os.makedirs(pasta_saida, exist_ok=True)
+    for nome in sorted(os.listdir(pasta_dados)):
+        if not nome.endswith(".dat"):
+            continue
+        saida = os.path.join(pasta_saida, os.path.splitext(nome)[0] + EXTENSAO)
+        compilar_instancia(os.path.join(pasta_dados, nome), saida, com_distancias)
+        print(f"📦 {nome} -> {saida}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compila instâncias .dat para o formato binário .cbin")
+    parser.add_argument("entrada", nargs="?", default="dados", help="arquivo .dat ou pasta (padrão: dados)")
+    parser.add_argument("--saida", default="compilados", help="pasta de saída (padrão: compilados)")
+    parser.add_argument("--distancias", action="store_true",
+                        help="inclui a matriz de distâncias pré-calculada (Floyd-Warshall)")
+    args = parser.parse_args(argv)
+
+    if os.path.isdir(args.entrada):
+        compilar_pasta(args.entrada, args.saida, args.distancias)
+    else:
+        os.makedirs(args.saida, exist_ok=True)
+        nome = os.path.splitext(os.path.basename(args.entrada))[0] + EXTENSAO
+        compilar_instancia(args.entrada, os.path.join(args.saida, nome), args.distancias)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import json
+import time
+
+
+class Instrumentacao:
+    # Contadores e tempos acumulados durante a execução. Cada evento é repassado aos
+    # observadores (callbacks `observador(nome, dados)`), junto com o `contexto` fixo.
+    # As funções do solver recebem `instrumentacao=None` por padrão e, nesse caso, só
+    # mantêm contadores locais, sem nenhuma chamada extra.
+    __slots__ = ('contadores', 'tempos', 'observadores', 'contexto')
+
+    def __init__(self, *observadores, **contexto):
+        self.contadores = {}
+        self.tempos = {}
+        self.observadores = list(observadores)
+        self.contexto = contexto
+
+    def observar(self, observador):
+        self.observadores.append(observador)
+        return observador
+
+    def contar(self, nome, quantidade=1):
+        self.contadores[nome] = self.contadores.get(nome, 0) + quantidade
+
+    def medir(self, nome, segundos):
+        self.tempos[nome] = self.tempos.get(nome, 0.0) + segundos
+
+    def evento(self, nome, **dados):
+        if self.observadores:
+            dados = {**self.contexto, **dados}
+            for observador in self.observadores:
+                observador(nome, dados)
+
+    def resumo(self):
+        return {"contadores": dict(self.contadores), "tempos": dict(self.tempos)}
+
+
+class LogJsonLinhas:
+    # Observador que grava cada evento como uma linha JSON (uma única escrita por linha,
+    # então vários processos podem anexar ao mesmo arquivo)
+    def __init__(self, caminho, modo="a"):
+        self.arquivo = open(caminho, modo, encoding="utf-8")
+
+    def __call__(self, nome, dados):
+        registro = {"evento": nome, "t": round(time.time(), 6), **dados}
+        self.arquivo.write(json.dumps(registro, ensure_ascii=False) + "\n")
+        self.arquivo.flush()
+
+    def fechar(self):
+        self.arquivo.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excecao):
+        self.fechar()
@@ -1,5 +1,159 @@
-def leitor_arquivo(path):
+import numpy as np
+
+from matriz_distancias import calcular_distancias
+
+CHAVES_CABECALHO = ("Optimal value:", "Capacity:", "Depot Node:", "#Nodes:", "#Edges:", "#Arcs:",
+                    "#Required N:", "#Required E:", "#Required A:")
+SECOES = {"ReN.": "ReN", "ReE.": "ReE", "EDGE": "EDGE", "ReA.": "ReA", "ARC": "ARC"}
+PREFIXOS_SECAO = tuple(SECOES)
+
+# Códigos de tipo de serviço usados nas colunas compactas
+SERVICO_NO, SERVICO_ARESTA, SERVICO_ARCO = 0, 1, 2
+
+
+class ErroLeitura(Exception):
+    pass
+
+
+class Cabecalho:
+    __slots__ = ('nome', 'valor_otimo', 'veiculos', 'capacidade', 'deposito', 'num_vertices',
+                 'num_arestas', 'num_arcos', 'req_vertices', 'req_arestas', 'req_arcos')
+
+    CAMPOS = {
+        "Optimal value": ('valor_otimo', int),
+        "#Vehicles": ('veiculos', int),
+        "Capacity": ('capacidade', int),
+        "Depot Node": ('deposito', int),
+        "#Nodes": ('num_vertices', int),
+        "#Edges": ('num_arestas', int),
+        "#Arcs": ('num_arcos', int),
+        "#Required N": ('req_vertices', int),
+        "#Required E": ('req_arestas', int),
+        "#Required A": ('req_arcos', int),
+    }
+
+    def __init__(self, campos):
+        self.nome = campos.get("Name", "")
+        for chave, (atributo, tipo) in self.CAMPOS.items():
+            valor = campos.get(chave)
+            try:
+                setattr(self, atributo, tipo(valor) if valor is not None else None)
+            except ValueError:
+                raise ErroLeitura(f"Valor inválido no cabeçalho: {chave}: {valor}")
+
+    def __repr__(self):
+        campos = ", ".join(f"{a}={getattr(self, a)!r}" for a in self.__slots__)
+        return f"Cabecalho({campos})"
+
+
+class Instancia:
+    # Saída compacta do leitor: colunas numpy na ordem do arquivo (sem deduplicar).
+    # Arestas e arcos incluem os requeridos, marcados em `*_requerida`; `servicos_*` descreve
+    # só os requeridos, e a k-ésima linha marcada corresponde ao k-ésimo serviço do mesmo tipo.
+    __slots__ = ('cabecalho', 'arestas_u', 'arestas_v', 'arestas_custo', 'arestas_requerida',
+                 'arcos_u', 'arcos_v', 'arcos_custo', 'arcos_requerida',
+                 'servicos_tipo', 'servicos_origem', 'servicos_destino',
+                 'servicos_demanda', 'servicos_custo', 'servicos_transporte')
+
+    def vertices(self):
+        return np.unique(np.concatenate([
+            self.arestas_u, self.arestas_v, self.arcos_u, self.arcos_v,
+            self.servicos_origem[self.servicos_tipo == SERVICO_NO]
+        ]))
+
+
+def _registros(path):
+    # Percorre o arquivo uma única vez: gera ("header", chave, valor) e (secao, partes, linha)
+    secao_atual = None
+    try:
+        arquivo = open(path, "r", encoding="utf-8")
+    except OSError as e:
+        raise ErroLeitura(f"Erro ao ler o arquivo '{path}': {e}") from e
+
+    with arquivo:
+        for linha in arquivo:
+            linha = linha.strip()
+            if not linha:
+                continue
+
+            if linha.startswith(CHAVES_CABECALHO) or linha.startswith(("Name:", "#Vehicles:")):
+                chave, valor = linha.split(":", 1)
+                yield "header", chave.strip(), valor.strip()
+                continue
+
+            # Texto livre ("Based on carp instance ...") também aparece no meio das seções
+            minusculas = linha.lower()
+            if linha.startswith("//") or minusculas.startswith("based") or "based on the" in minusculas:
+                continue
+
+            if linha.startswith(PREFIXOS_SECAO):
+                secao_atual = next(SECOES[p] for p in PREFIXOS_SECAO if linha.startswith(p))
+                continue
+
+            if secao_atual:
+                partes = linha.split()
+                yield secao_atual, partes, linha
+
+
+def ler_instancia(path):
+    campos = {}
+    arestas = ([], [], [], [])
+    arcos = ([], [], [], [])
+    servicos = ([], [], [], [], [], [])
+
+    for registro in _registros(path):
+        if registro[0] == "header":
+            campos[registro[1]] = registro[2]
+            continue
+
+        secao, partes, linha = registro
+        try:
+            if secao == "ReN":
+                v = int(partes[0].replace("N", ""))
+                valores = (SERVICO_NO, v, v, int(partes[1]), int(partes[2]), 0)
+            else:
+                u, v, custo = int(partes[1]), int(partes[2]), int(partes[3])
+                destino = arestas if secao in ("ReE", "EDGE") else arcos
+                destino[0].append(u)
+                destino[1].append(v)
+                destino[2].append(custo)
+                destino[3].append(False)
+                if secao in ("EDGE", "ARC"):
+                    continue
+                tipo = SERVICO_ARESTA if secao == "ReE" else SERVICO_ARCO
+                valores = (tipo, u, v, int(partes[4]), int(partes[5]), custo)
+                # Só marca a linha depois de ler demanda e custo: sem eles fica como não requerida
+                destino[3][-1] = True
+        except (ValueError, IndexError):
+            print(f"[Aviso] Linha ignorada por erro: {linha}")
+            continue
+        for coluna, valor in zip(servicos, valores):
+            coluna.append(valor)
+
+    if not campos:
+        raise ErroLeitura(f"Arquivo '{path}' sem cabeçalho de instância.")
+
+    inst = Instancia()
+    inst.cabecalho = Cabecalho(campos)
+    inst.arestas_u, inst.arestas_v, inst.arestas_custo = (np.array(c, dtype=np.int64) for c in arestas[:3])
+    inst.arcos_u, inst.arcos_v, inst.arcos_custo = (np.array(c, dtype=np.int64) for c in arcos[:3])
+    inst.arestas_requerida = np.array(arestas[3], dtype=bool)
+    inst.arcos_requerida = np.array(arcos[3], dtype=bool)
+    inst.servicos_tipo = np.array(servicos[0], dtype=np.int8)
+    (inst.servicos_origem, inst.servicos_destino, inst.servicos_demanda,
+     inst.servicos_custo, inst.servicos_transporte) = (np.array(c, dtype=np.int64) for c in servicos[1:])
+    return inst
+
+
+def instancia_para_dados(inst):
+    # Dicionário de leitor_arquivo, inserindo na ordem do arquivo (ReN, ReE/EDGE, ReA/ARC)
+    cab = inst.cabecalho
     header = {}
+    for chave, (atributo, _) in Cabecalho.CAMPOS.items():
+        valor = getattr(cab, atributo)
+        if valor is not None and chave + ":" in CHAVES_CABECALHO:
+            header[chave] = str(valor)
+
     vertices = set()
     arestas = set()
     arcos = set()
@@ -7,78 +161,38 @@ def leitor_arquivo(path):
     arestas_requeridas = set()
     arcos_requeridos = set()
 
-    secao_atual = None
-
-    try:
-        with open(path, "r", encoding="utf-8") as arquivo:
-            linhas = arquivo.readlines()
-    except FileNotFoundError:
-        print(f"Erro: Arquivo '{path}' não encontrado.")
-        exit()
-    except Exception as e:
-        print(f"Erro ao ler o arquivo: {e}")
-        exit()
-
-    for linha in linhas:
-        linha = linha.strip()
-
-        if linha.startswith(("Optimal value:", "Capacity:", "Depot Node:", "#Nodes:", "#Edges:", "#Arcs:",
-                             "#Required N:", "#Required E:", "#Required A:")):
-            chave, valor = linha.split(":", 1)
-            header[chave.strip()] = valor.strip()
-            continue
+    tipos = inst.servicos_tipo.tolist()
+    origens = inst.servicos_origem.tolist()
+    destinos = inst.servicos_destino.tolist()
+    demandas = inst.servicos_demanda.tolist()
+    custos = inst.servicos_custo.tolist()
 
-        if not linha or linha.startswith("//") or linha.startswith("Name:") or "based on the" in linha.lower():
-            continue
+    for tipo, v, demanda, custo_servico in zip(tipos, origens, demandas, custos):
+        if tipo == SERVICO_NO:
+            vertices_requeridos.add((v, (demanda, custo_servico)))
+            vertices.add(v)
 
-        if linha.startswith("ReN."):
-            secao_atual = "ReN"
-            continue
-        elif linha.startswith("ReE."):
-            secao_atual = "ReE"
-            continue
-        elif linha.startswith("EDGE"):
-            secao_atual = "EDGE"
-            continue
-        elif linha.startswith("ReA."):
-            secao_atual = "ReA"
-            continue
-        elif linha.startswith("ARC"):
-            secao_atual = "ARC"
-            continue
+    servicos_aresta = iter([(d, c) for t, d, c in zip(tipos, demandas, custos) if t == SERVICO_ARESTA])
+    for origem, destino, custo_transporte, requerida in zip(
+            inst.arestas_u.tolist(), inst.arestas_v.tolist(), inst.arestas_custo.tolist(),
+            inst.arestas_requerida.tolist()):
+        aresta = (min(origem, destino), max(origem, destino))
+        arestas.add((aresta, custo_transporte))
+        vertices.update([origem, destino])
+        if requerida:
+            demanda, custo_servico = next(servicos_aresta)
+            arestas_requeridas.add((aresta, (custo_transporte, demanda, custo_servico)))
 
-        if linha and secao_atual:
-            partes = linha.split()
-            try:
-                if secao_atual == "ReN":
-                    vertice = int(partes[0].replace("N", ""))
-                    demanda = int(partes[1])
-                    custo_servico = int(partes[2])
-                    vertices_requeridos.add((vertice, (demanda, custo_servico)))
-                    vertices.add(vertice)
-                elif secao_atual in ["ReE", "EDGE"]:
-                    origem, destino = int(partes[1]), int(partes[2])
-                    aresta = (min(origem, destino), max(origem, destino))
-                    custo_transporte = int(partes[3])
-                    arestas.add((aresta, custo_transporte))
-                    vertices.update([origem, destino])
-                    if secao_atual == "ReE":
-                        demanda = int(partes[4])
-                        custo_servico = int(partes[5])
-                        arestas_requeridas.add((aresta, (custo_transporte, demanda, custo_servico)))
-                elif secao_atual in ["ReA", "ARC"]:
-                    origem, destino = int(partes[1]), int(partes[2])
-                    arco = (origem, destino)
-                    custo_transporte = int(partes[3])
-                    arcos.add((arco, custo_transporte))
-                    vertices.update([origem, destino])
-                    if secao_atual == "ReA":
-                        demanda = int(partes[4])
-                        custo_servico = int(partes[5])
-                        arcos_requeridos.add((arco, (custo_transporte, demanda, custo_servico)))
-            except ValueError:
-                print(f"[Aviso] Linha ignorada por erro: {linha}")
-                continue
+    servicos_arco = iter([(d, c) for t, d, c in zip(tipos, demandas, custos) if t == SERVICO_ARCO])
+    for origem, destino, custo_transporte, requerida in zip(
+            inst.arcos_u.tolist(), inst.arcos_v.tolist(), inst.arcos_custo.tolist(),
+            inst.arcos_requerida.tolist()):
+        arco = (origem, destino)
+        arcos.add((arco, custo_transporte))
+        vertices.update([origem, destino])
+        if requerida:
+            demanda, custo_servico = next(servicos_arco)
+            arcos_requeridos.add((arco, (custo_transporte, demanda, custo_servico)))
 
     return {
         "header": header,
@@ -90,19 +204,10 @@ def leitor_arquivo(path):
         "arcos_requeridos": arcos_requeridos
     }
 
+
+def leitor_arquivo(path):
+    # Dicionário com conjuntos usado pelo roteamento; mesmo parser (e mesmos avisos) de ler_instancia
+    return instancia_para_dados(ler_instancia(path))
+
 def criar_matriz_distancias(vertices, arestas, arcos):
-    distancias = {v: {u: float('inf') for u in vertices} for v in vertices}
-    for v in vertices:
-        distancias[v][v] = 0
-    for (u, v), custo in arestas:
-        distancias[u][v] = custo
-        distancias[v][u] = custo
-    for (u, v), custo in arcos:
-        distancias[u][v] = custo
-
-    for k in vertices:
-        for i in vertices:
-            for j in vertices:
-                if distancias[i][j] > distancias[i][k] + distancias[k][j]:
-                    distancias[i][j] = distancias[i][k] + distancias[k][j]
-    return distancias
+    return calcular_distancias(vertices, arestas, arcos)
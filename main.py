@@ -1,15 +1,25 @@
+import argparse
 import os
 import re
 import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from algoritmo_construtivo import (
+    CONSTRUTIVOS,
+    RELOGIOS,
     preparar_clientes,
     salvar_solucao,
-    grasp_rotas  
-)
-from leitor_grafo import (
-    leitor_arquivo,
-    criar_matriz_distancias
+    grasp_rotas,
+    grasp_rotas_paralelo
 )
+from leitor_grafo import ErroLeitura, instancia_para_dados, leitor_arquivo, ler_instancia
+from instancia_binaria import EXTENSAO, carregar_instancia_binaria, ler_metadados
+from cache_distancias import criar_matriz_distancias_cache, impressao_grafo
+from matriz_distancias import calcular_distancias, calcular_distancias_terminais, grafo_esparso, terminais_clientes
+from reducao_grafo import reduzir_grafo
+from instrumentacao import Instrumentacao, LogJsonLinhas
+
+OPCOES_GRASP_PADRAO = {"iteracoes": 10, "tempo_limite": None, "max_sem_melhora": None, "medida_tempo": "parede",
+                       "construtivo": "savings", "entre_rotas": None}
 
 
 
@@ -22,74 +32,341 @@ def extrair_numero(nome):
     numeros = re.findall(r'\d+', nome)
     return int(numeros[0]) if numeros else float('inf')
 
-def main():
-    pasta_dados = "dados"
+def ler_cabecalho(caminho):
+    if caminho.endswith(EXTENSAO):
+        return ler_metadados(caminho)[0]["cabecalho"]
+    cabecalho = {}
+    with open(caminho, "r", encoding="utf-8") as arquivo:
+        for linha in arquivo:
+            linha = linha.strip()
+            if linha.startswith(("ReN.", "ReE.", "EDGE", "ReA.", "ARC")):
+                break
+            if ":" in linha:
+                chave, valor = linha.split(":", 1)
+                cabecalho[chave.strip()] = valor.strip()
+    return cabecalho
+
+def tamanho_instancia(caminho):
+    cabecalho = ler_cabecalho(caminho)
+    def inteiro(chave):
+        try:
+            return int(cabecalho.get(chave, 0))
+        except ValueError:
+            return 0
+    requeridos = inteiro("#Required N") + inteiro("#Required E") + inteiro("#Required A")
+    return requeridos, inteiro("#Nodes")
+
+def calcular_distancias_instancia(vertices, arestas, arcos, terminais, reducao=None, usar_cache=True):
+    # Caminho de produção das distâncias: cadeias de grau 2 e pontas sem serviço saem antes
+    # (`reducao` já calculada pode ser reaproveitada) e, em grafos esparsos, o Dijkstra parte
+    # só dos terminais. Devolve (distancias, reducao, acerto_cache).
+    esparso = grafo_esparso(len(vertices), len(arestas), len(arcos))
+    if reducao is None:
+        reducao = reduzir_grafo(vertices, arestas, arcos, terminais)
+    if reducao.removidos:
+        vertices, arestas, arcos = reducao.vertices, (), reducao.arcos
+    alvo = terminais if esparso else None
+    if usar_cache:
+        distancias, acerto_cache = criar_matriz_distancias_cache(vertices, arestas, arcos, alvo)
+    elif alvo is None:
+        distancias, acerto_cache = calcular_distancias(vertices, arestas, arcos), False
+    else:
+        distancias, acerto_cache = calcular_distancias_terminais(vertices, arestas, arcos, alvo), False
+    return distancias, reducao, acerto_cache
+
+def processar_instancia(nome_arquivo, pasta_dados, pasta_saida, grasp_workers=1, semente=None,
+                        tamanho_vizinhanca=None, log_json=None, opcoes_grasp=None, grupo=None):
+    # Com `log_json`, contadores e eventos do solver são anexados ao arquivo JSON-lines.
+    # `opcoes_grasp` sobrescreve OPCOES_GRASP_PADRAO (iterações, prazo e parada antecipada).
+    # `grupo` (de processar_grupo) compartilha terminais e redução entre instâncias irmãs e traz
+    # as instâncias já lidas ao agrupar.
+    opcoes = dict(OPCOES_GRASP_PADRAO, **(opcoes_grasp or {}))
+    if log_json is None:
+        return _processar_instancia(nome_arquivo, pasta_dados, pasta_saida, grasp_workers, semente,
+                                    tamanho_vizinhanca, None, opcoes, grupo)
+    with LogJsonLinhas(log_json) as observador:
+        instrumentacao = Instrumentacao(observador, instancia=nome_arquivo)
+        return _processar_instancia(nome_arquivo, pasta_dados, pasta_saida, grasp_workers, semente,
+                                    tamanho_vizinhanca, instrumentacao, opcoes, grupo)
+
+def _descrever_opcoes(opcoes, tempo_limite):
+    partes = [f"{opcoes['iteracoes']} iterações" if opcoes["iteracoes"] is not None else "iterações sem limite"]
+    if tempo_limite is not None:
+        partes.append(f"prazo de {tempo_limite:.2f} s ({opcoes['medida_tempo']})")
+    if opcoes["max_sem_melhora"] is not None:
+        partes.append(f"parada após {opcoes['max_sem_melhora']} iterações sem melhora")
+    if opcoes["construtivo"] != OPCOES_GRASP_PADRAO["construtivo"]:
+        partes.append(f"construção por {opcoes['construtivo']}")
+    if opcoes["entre_rotas"]:
+        partes.append("busca entre rotas")
+    return ", ".join(partes)
+
+def _descrever_pipeline(opcoes):
+    # Fases de cada iteração, na ordem de iteracao_grasp
+    entre_rotas = opcoes["entre_rotas"] if opcoes["entre_rotas"] is not None else opcoes["construtivo"] == "split"
+    fases = ["rota gigante + split" if opcoes["construtivo"] == "split" else "savings"]
+    fases += ["busca entre rotas", "2-opt"] if entre_rotas else ["2-opt", "realocação", "refusão"]
+    return " + ".join(fases)
+
+def _processar_instancia(nome_arquivo, pasta_dados, pasta_saida, grasp_workers, semente, tamanho_vizinhanca,
+                         instrumentacao, opcoes, grupo=None):
+    caminho_completo = os.path.join(pasta_dados, nome_arquivo)
+    print(f"\n🔄 Processando: {nome_arquivo}")
+    log = [f"Instância: {nome_arquivo}\n"]
+
+    tempo_ini_total = time.time()
+    # O prazo é descontado no mesmo relógio em que o GRASP o mede (parede ou CPU)
+    relogio_prazo = RELOGIOS[opcoes["medida_tempo"]]
+    inicio_prazo = relogio_prazo()
+
+    try:
+        distancias_pre = None
+        if caminho_completo.endswith(EXTENSAO):
+            inst, distancias_pre = carregar_instancia_binaria(caminho_completo)
+            dados = instancia_para_dados(inst)
+        elif grupo is not None and grupo["instancias"].get(nome_arquivo) is not None:
+            # Já lida por assinatura_arquivo: o .dat não é relido
+            dados = instancia_para_dados(grupo["instancias"].pop(nome_arquivo))
+        else:
+            dados = leitor_arquivo(caminho_completo)
+    except ErroLeitura as e:
+        print(f"❌ {e}")
+        if instrumentacao is not None:
+            instrumentacao.evento("erro_leitura", erro=str(e))
+        log.append(f"  ➤ Erro de leitura: {e}\n")
+        log.append("--------------------------------------------------\n")
+        return "".join(log)
+    vertices = dados["vertices"]
+    arestas = dados["arestas"]
+    arcos = dados["arcos"]
+    vertices_req = dados["vertices_requeridos"]
+    arestas_req = dados["arestas_requeridas"]
+    arcos_req = dados["arcos_requeridos"]
+    capacidade = int(dados["header"].get("Capacity"))
+    deposito = int(dados["header"].get("Depot Node"))
+
+    clientes = preparar_clientes(vertices_req, arestas_req, arcos_req)
+    if distancias_pre is not None:
+        distancias = distancias_pre
+        log.append("  ➤ Distâncias: pré-calculadas no arquivo compilado\n")
+    else:
+        terminais = terminais_clientes(clientes, deposito)
+        reducao = None
+        if grupo is not None and grupo["terminais"] is not None:
+            # Irmãs usam a união dos terminais do grupo: a mesma redução e a mesma chave de cache
+            terminais, reducao = grupo["terminais"], grupo["reducao"]
+        distancias, reducao, acerto_cache = calcular_distancias_instancia(vertices, arestas, arcos,
+                                                                          terminais, reducao)
+        if grupo is not None:
+            grupo["reducao"] = reducao
+        if reducao.removidos:
+            log.append(f"  ➤ Redução do grafo: {len(vertices)} -> {len(reducao.vertices)} vértices\n")
+        log.append(f"  ➤ Cache de distâncias: {'acerto' if acerto_cache else 'falha'}\n")
+
+    # O prazo vale para a instância inteira: leitura e distâncias já consumiram parte dele
+    tempo_limite = opcoes["tempo_limite"]
+    if tempo_limite is not None:
+        tempo_limite = max(tempo_limite - (relogio_prazo() - inicio_prazo), 0.0)
+    descricao = _descrever_opcoes(opcoes, tempo_limite)
+    print(f"🚀 Iniciando GRASP com {descricao}...")
+    log.append(f"  ➤ GRASP: {descricao}\n")
+    tempo_ini_grasp = time.time()
+    if grasp_workers > 1:
+        rotas_otimizadas, custos_iteracoes = grasp_rotas_paralelo(
+            clientes, deposito, distancias, capacidade,
+            iteracoes=opcoes["iteracoes"], ganho_minimo=0.1,
+            semente=semente if semente is not None else 0, workers=grasp_workers,
+            tamanho_vizinhanca=tamanho_vizinhanca, tempo_limite=tempo_limite,
+            max_sem_melhora=opcoes["max_sem_melhora"], medida_tempo=opcoes["medida_tempo"],
+            construtivo=opcoes["construtivo"], entre_rotas=opcoes["entre_rotas"]
+        )
+        log.append(f"  ➤ Custos por iteração: {' '.join(str(int(c)) for c in custos_iteracoes)}\n")
+        if instrumentacao is not None:
+            # Os processos do GRASP não compartilham a instrumentação; só os custos voltam
+            for iteracao, custo in enumerate(custos_iteracoes):
+                instrumentacao.evento("iteracao", iteracao=iteracao, custo=custo)
+    else:
+        rotas_otimizadas = grasp_rotas(
+            clientes, deposito, distancias, capacidade,
+            iteracoes=opcoes["iteracoes"], ganho_minimo=0.1, semente=semente,
+            tamanho_vizinhanca=tamanho_vizinhanca, instrumentacao=instrumentacao,
+            tempo_limite=tempo_limite, max_sem_melhora=opcoes["max_sem_melhora"],
+            medida_tempo=opcoes["medida_tempo"], construtivo=opcoes["construtivo"],
+            entre_rotas=opcoes["entre_rotas"]
+        )
+    tempo_fim_grasp = time.time()
+
+    nome_saida = os.path.join(pasta_saida, f"sol-{os.path.splitext(nome_arquivo)[0]}.dat")
+    custo_total = salvar_solucao(rotas_otimizadas, nome_saida, deposito, distancias)
+    tempo_total = time.time() - tempo_ini_total
+
+    if instrumentacao is not None:
+        instrumentacao.evento("instancia", rotas=len(rotas_otimizadas), custo=custo_total,
+                              tempo_grasp=tempo_fim_grasp - tempo_ini_grasp, tempo_total=tempo_total,
+                              **instrumentacao.resumo())
+
+    print(f"✅ GRASP finalizado. Rotas: {len(rotas_otimizadas)}, Custo: {int(custo_total)}")
+    print(f"💾 Solução salva em: {nome_saida}\n")
+
+    log.append(f"  ➤ Rotas finais: {len(rotas_otimizadas)}\n")
+    log.append(f"  ➤ Custo total final: {int(custo_total)}\n")
+    log.append(f"  ➤ Tempo GRASP: {tempo_fim_grasp - tempo_ini_grasp:.2f} s\n")
+    log.append(f"  ➤ Tempo total: {tempo_total:.2f} s\n")
+    log.append("--------------------------------------------------\n")
+    return "".join(log)
+
+def assinatura_arquivo(caminho):
+    # Impressão do grafo de deslocamento, terminais (depósito e pontas dos serviços) e a instância
+    # lida de um .dat, reaproveitada no processamento (.cbin é recarregado via mmap);
+    # arquivos ilegíveis ficam num grupo só deles, sem terminais
+    try:
+        if caminho.endswith(EXTENSAO):
+            inst, _ = carregar_instancia_binaria(caminho)
+        else:
+            inst = ler_instancia(caminho)
+    except ErroLeitura:
+        return caminho, None, None
+    dados = instancia_para_dados(inst)
+    terminais = {int(dados["header"]["Depot Node"])} if "Depot Node" in dados["header"] else set()
+    terminais.update(inst.servicos_origem.tolist())
+    terminais.update(inst.servicos_destino.tolist())
+    lida = None if caminho.endswith(EXTENSAO) else inst
+    return impressao_grafo(dados["vertices"], dados["arestas"], dados["arcos"]), terminais, lida
+
+def agrupar_por_grafo(arquivos_dat, pasta_dados):
+    # Instâncias irmãs (mesmo grafo, outros serviços) rodam juntas e reaproveitam as distâncias:
+    # devolve (nomes, terminais, instancias), com a união dos terminais do grupo (None se algum não
+    # foi lido) e as instâncias .dat já lidas, por nome
+    grupos = {}
+    for nome in arquivos_dat:
+        impressao, terminais, inst = assinatura_arquivo(os.path.join(pasta_dados, nome))
+        nomes, uniao, instancias = grupos.setdefault(impressao, ([], set(), {}))
+        nomes.append(nome)
+        instancias[nome] = inst
+        if terminais is None or uniao is None:
+            grupos[impressao] = (nomes, None, instancias)
+        else:
+            uniao.update(terminais)
+    return [(nomes, sorted(uniao) if uniao is not None else None, instancias)
+            for nomes, uniao, instancias in grupos.values()]
+
+def processar_grupo(nomes, terminais, instancias, *args):
+    # A redução do grafo sai uma vez, com os terminais de todas as irmãs, e vale para o grupo todo
+    grupo = {"terminais": terminais, "reducao": None, "instancias": instancias}
+    return [processar_instancia(nome, *args, grupo=grupo) for nome in nomes]
+
+def _escrever_em_ordem(log, arquivos_dat, registros, proximo):
+    while proximo < len(arquivos_dat) and arquivos_dat[proximo] in registros:
+        log.write(registros.pop(arquivos_dat[proximo]))
+        log.flush()
+        proximo += 1
+    return proximo
+
+def executar_sequencial(arquivos_dat, pasta_dados, pasta_saida, log, grasp_workers=1, semente=None,
+                        tamanho_vizinhanca=None, log_json=None, opcoes_grasp=None):
+    registros = {}
+    proximo = 0
+    for grupo, terminais, instancias in agrupar_por_grafo(arquivos_dat, pasta_dados):
+        textos = processar_grupo(grupo, terminais, instancias, pasta_dados, pasta_saida, grasp_workers,
+                                 semente, tamanho_vizinhanca, log_json, opcoes_grasp)
+        registros.update(zip(grupo, textos))
+        proximo = _escrever_em_ordem(log, arquivos_dat, registros, proximo)
+
+def executar_em_paralelo(arquivos_dat, pasta_dados, pasta_saida, workers, log, grasp_workers=1, semente=None,
+                         tamanho_vizinhanca=None, log_json=None, opcoes_grasp=None):
+    # Um grupo de instâncias irmãs por tarefa, maiores primeiro (reduz o makespan);
+    # o log segue a ordem original
+    ordem_execucao = sorted(
+        agrupar_por_grafo(arquivos_dat, pasta_dados),
+        key=lambda grupo: max(tamanho_instancia(os.path.join(pasta_dados, nome)) for nome in grupo[0]),
+        reverse=True
+    )
+    registros = {}
+    proximo = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futuros = {
+            executor.submit(processar_grupo, grupo, terminais, instancias, pasta_dados, pasta_saida,
+                            grasp_workers, semente, tamanho_vizinhanca, log_json, opcoes_grasp): tuple(grupo)
+            for grupo, terminais, instancias in ordem_execucao
+        }
+        for futuro in as_completed(futuros):
+            registros.update(zip(futuros[futuro], futuro.result()))
+            proximo = _escrever_em_ordem(log, arquivos_dat, registros, proximo)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="GRASP para as instâncias de dados/ (.dat ou .cbin)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="número de processos para rodar instâncias em paralelo (padrão: 1)")
+    parser.add_argument("--grasp-workers", type=int, default=1,
+                        help="processos para as iterações do GRASP de cada instância (padrão: 1)")
+    parser.add_argument("--semente", type=int, default=None,
+                        help="semente base do GRASP; cada iteração usa semente + índice")
+    parser.add_argument("--vizinhanca", type=int, default=None,
+                        help="2-opt, realocação e busca entre rotas restritos a listas de k vizinhos mais próximos "
+                             "(padrão: busca completa)")
+    parser.add_argument("--iteracoes", type=int, default=OPCOES_GRASP_PADRAO["iteracoes"],
+                        help="iterações do GRASP por instância; 0 = sem limite (padrão: 10)")
+    parser.add_argument("--tempo-limite", type=float, default=None,
+                        help="prazo em segundos por instância (leitura + distâncias + GRASP)")
+    parser.add_argument("--medida-tempo", choices=("parede", "cpu"), default="parede",
+                        help="relógio usado pelo prazo (padrão: parede)")
+    parser.add_argument("--max-sem-melhora", type=int, default=None,
+                        help="encerra o GRASP após N iterações seguidas sem melhora")
+    parser.add_argument("--construtivo", choices=CONSTRUTIVOS, default=OPCOES_GRASP_PADRAO["construtivo"],
+                        help="construção de cada iteração: savings ou rota gigante + split (padrão: savings)")
+    parser.add_argument("--entre-rotas", action="store_true",
+                        help="busca entre rotas (realocação, troca, 2-opt*) também depois do savings, no lugar "
+                             "de realocação + refusão (o split sempre a usa)")
+    parser.add_argument("--log-json", default=None,
+                        help="grava contadores e eventos do solver neste arquivo JSON-lines")
+    parser.add_argument("--dados", default="dados",
+                        help="pasta (ou arquivo) com instâncias .dat ou compiladas .cbin (padrão: dados)")
+    args = parser.parse_args(argv)
+    if args.iteracoes == 0 and args.tempo_limite is None and args.max_sem_melhora is None:
+        parser.error("--iteracoes 0 exige --tempo-limite ou --max-sem-melhora")
+    opcoes_grasp = {
+        "iteracoes": args.iteracoes or None,
+        "tempo_limite": args.tempo_limite,
+        "max_sem_melhora": args.max_sem_melhora,
+        "medida_tempo": args.medida_tempo,
+        "construtivo": args.construtivo,
+        "entre_rotas": args.entre_rotas or None,
+    }
+
+    pasta_dados = args.dados
     pasta_saida = os.path.join("solucoes")
     log_path = os.path.join("log_execucao.txt")
 
-    if not os.path.isdir(pasta_dados):
-        print("Erro: A pasta 'dados/' não foi encontrada.")
+    if os.path.isfile(pasta_dados):
+        pasta_dados, arquivos_dat = os.path.split(pasta_dados)
+        arquivos_dat = [arquivos_dat]
+    elif os.path.isdir(pasta_dados):
+        arquivos_dat = sorted([f for f in os.listdir(pasta_dados) if f.endswith(('.dat', EXTENSAO))],
+                              key=lambda nome: (extrair_numero(nome), nome))
+    else:
+        print(f"Erro: '{pasta_dados}' não foi encontrado.")
         return
 
     os.makedirs(pasta_saida, exist_ok=True)
 
-    arquivos_dat = sorted([f for f in os.listdir(pasta_dados) if f.endswith('.dat')], key=extrair_numero)
-    
     if not arquivos_dat:
-        print("Nenhum arquivo .dat encontrado na pasta 'dados/'.")
+        print(f"Nenhuma instância (.dat ou {EXTENSAO}) encontrada em '{pasta_dados}'.")
         return
 
+    if args.log_json:
+        open(args.log_json, "w", encoding="utf-8").close()
+
     with open(log_path, "w", encoding="utf-8") as log:
-        log.write("LOG DE EXECUÇÃO - GRASP com realocação e refusão\n")
+        log.write(f"LOG DE EXECUÇÃO - GRASP ({_descrever_pipeline(opcoes_grasp)})\n")
         log.write("====================================\n\n")
 
-        for nome_arquivo in arquivos_dat:
-            caminho_completo = os.path.join(pasta_dados, nome_arquivo)
-            print(f"\n🔄 Processando: {nome_arquivo}")
-            log.write(f"Instância: {nome_arquivo}\n")
-
-            tempo_ini_total = time.time()
-
-            dados = leitor_arquivo(caminho_completo)
-            vertices = dados["vertices"]
-            arestas = dados["arestas"]
-            arcos = dados["arcos"]
-            vertices_req = dados["vertices_requeridos"]
-            arestas_req = dados["arestas_requeridas"]
-            arcos_req = dados["arcos_requeridos"]
-            capacidade = int(dados["header"].get("Capacity"))
-            deposito = int(dados["header"].get("Depot Node"))
-
-            distancias = criar_matriz_distancias(vertices, arestas, arcos)
-            clientes = preparar_clientes(vertices_req, arestas_req, arcos_req)
-
-            print("🚀 Iniciando GRASP com 10 iterações...")
-            tempo_ini_grasp = time.time()
-            rotas_otimizadas = grasp_rotas(
-                clientes, deposito, distancias, capacidade,
-                iteracoes=10, ganho_minimo=0.1
-            )
-            tempo_fim_grasp = time.time()
-
-            nome_saida = os.path.join(pasta_saida, f"sol-{nome_arquivo}")
-            salvar_solucao(rotas_otimizadas, nome_saida, deposito, distancias)
-            tempo_total = time.time() - tempo_ini_total
-
-            # Log
-            custo_total = sum(
-                sum(distancias[r["sequencia"][k]][r["sequencia"][k+1]] for k in range(len(r["sequencia"]) - 1)) +
-                sum(c["custo"] for c in r["clientes"])
-                for r in rotas_otimizadas
-            )
-
-            print(f"✅ GRASP finalizado. Rotas: {len(rotas_otimizadas)}, Custo: {int(custo_total)}")
-            print(f"💾 Solução salva em: {nome_saida}\n")
-
-            log.write(f"  ➤ Rotas finais: {len(rotas_otimizadas)}\n")
-            log.write(f"  ➤ Custo total final: {int(custo_total)}\n")
-            log.write(f"  ➤ Tempo GRASP: {tempo_fim_grasp - tempo_ini_grasp:.2f} s\n")
-            log.write(f"  ➤ Tempo total: {tempo_total:.2f} s\n")
-            log.write("--------------------------------------------------\n")
+        if args.workers > 1:
+            executar_em_paralelo(arquivos_dat, pasta_dados, pasta_saida, args.workers, log,
+                                 args.grasp_workers, args.semente, args.vizinhanca, args.log_json,
+                                 opcoes_grasp)
+        else:
+            executar_sequencial(arquivos_dat, pasta_dados, pasta_saida, log, args.grasp_workers, args.semente,
+                                args.vizinhanca, args.log_json, opcoes_grasp)
 
     print(f"\n📄 Log de execução salvo em: {log_path}")
 
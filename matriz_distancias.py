@@ -0,0 +1,296 @@
+import heapq
+
+import numpy as np
+
+INF = float('inf')
+# Sentinela de "sem caminho" no armazenamento compacto (int32)
+INF_INT32 = np.iinfo(np.int32).max
+
+
+class MatrizDistancias(dict):
+    # Matriz numpy com mapa vértice -> índice. `dist` pode ser a matriz densa n x n
+    # (float64 com INF, ou int32 com a sentinela INF_INT32) ou, para distâncias simétricas,
+    # só o triângulo superior empacotado linha a linha num vetor de n(n+1)/2 posições.
+    # d(u, v) lê direto do armazenamento; distancias[u][v] devolve as linhas como
+    # dicionários construídos sob demanda (__missing__), para o código que espera dict-de-dicts.
+
+    def __init__(self, vertices, dist):
+        super().__init__()
+        self.vertices = list(vertices)
+        self.indice = {v: i for i, v in enumerate(self.vertices)}
+        self.dist = dist
+        n = len(self.vertices)
+        self.triangular = dist.ndim == 1
+        if self.triangular:
+            # A linha a começa em a*n - a*(a-1)/2 e (a, b), com b >= a, fica b - a posições adiante
+            self._base = [a * (2 * n - a - 1) // 2 for a in range(n)]
+        else:
+            self._base = [a * n for a in range(n)]
+        self._base_np = np.array(self._base, dtype=np.intp)
+        self._plano = memoryview(np.ascontiguousarray(dist).reshape(-1))
+        self._sentinela = INF_INT32 if dist.dtype == np.int32 else INF
+        self.d = self._acessor()
+
+    def _acessor(self):
+        # d(u, v) como closure com tudo em variáveis locais: sem atributos nem ramos por chamada
+        indice, base, plano, sentinela = self.indice, self._base, self._plano, self._sentinela
+        if self.triangular:
+            def d(u, v):
+                i = indice[u]
+                j = indice[v]
+                valor = plano[base[i] + j] if i <= j else plano[base[j] + i]
+                return INF if valor == sentinela else valor
+        else:
+            def d(u, v):
+                valor = plano[base[indice[u]] + indice[v]]
+                return INF if valor == sentinela else valor
+        return d
+
+    def valores(self, i, j):
+        # Leitura vetorizada das posições (i, j) (arrays de índices, com broadcast): int64
+        # quando todas são finitas, senão float64 com INF
+        if self.triangular:
+            brutos = self.dist[self._base_np[np.minimum(i, j)] + np.maximum(i, j)]
+        else:
+            brutos = self.dist[i, j]
+        if brutos.dtype != np.int32:
+            return np.array(brutos, dtype=np.float64)
+        ausentes = brutos == INF_INT32
+        if not ausentes.any():
+            return brutos.astype(np.int64)
+        valores = brutos.astype(np.float64)
+        valores[ausentes] = INF
+        return valores
+
+    def densa(self):
+        indices = np.arange(len(self.vertices))
+        return np.asarray(self.valores(indices[:, None], indices[None, :]), dtype=np.float64)
+
+    def __missing__(self, u):
+        if u not in self.indice:
+            raise KeyError(u)
+        linha = self._construir_linha(self.indice[u])
+        dict.__setitem__(self, u, linha)
+        return linha
+
+    def _construir_linha(self, i):
+        valores = self.valores(i, np.arange(len(self.vertices))).tolist()
+        return {v: (int(d) if d != INF else INF) for v, d in zip(self.vertices, valores)}
+
+    def __contains__(self, u):
+        return u in self.indice
+
+    def __iter__(self):
+        return iter(self.vertices)
+
+    def __len__(self):
+        return len(self.vertices)
+
+    def keys(self):
+        return list(self.vertices)
+
+    def values(self):
+        return [self[u] for u in self.vertices]
+
+    def items(self):
+        return [(u, self[u]) for u in self.vertices]
+
+    def get(self, u, padrao=None):
+        return self[u] if u in self.indice else padrao
+
+    def __reduce__(self):
+        return (self.__class__, (self.vertices, self.dist))
+
+
+class MatrizPredecessores(MatrizDistancias):
+    # Predecessores guardados como índices (-1 = sem predecessor).
+
+    def _construir_linha(self, i):
+        valores = self.dist[i].tolist()
+        return {v: (self.vertices[p] if p >= 0 else None) for v, p in zip(self.vertices, valores)}
+
+
+def matriz_adjacencia(vertices, arestas, arcos):
+    vertices = list(vertices)
+    indice = {v: i for i, v in enumerate(vertices)}
+    n = len(vertices)
+
+    dist = np.full((n, n), INF, dtype=np.float64)
+    np.fill_diagonal(dist, 0)
+    pred = np.full((n, n), -1, dtype=np.int64)
+
+    # Mesma ordem de atribuição do laço original (arestas repetidas: vale a última)
+    for (u, v), custo in arestas:
+        iu, iv = indice[u], indice[v]
+        dist[iu, iv] = custo
+        dist[iv, iu] = custo
+        pred[iu, iv] = iu
+        pred[iv, iu] = iv
+    for (u, v), custo in arcos:
+        iu, iv = indice[u], indice[v]
+        dist[iu, iv] = custo
+        pred[iu, iv] = iu
+
+    return vertices, dist, pred
+
+
+def floyd_warshall_numpy(dist, pred=None):
+    # Relaxa a matriz inteira para cada k: dist[i][j] = min(dist[i][j], dist[i][k] + dist[k][j])
+    via_k = np.empty_like(dist)
+    for k in range(dist.shape[0]):
+        np.add(dist[:, k, None], dist[None, k, :], out=via_k)
+        if pred is None:
+            np.minimum(dist, via_k, out=dist)
+        else:
+            melhora = via_k < dist
+            dist[melhora] = via_k[melhora]
+            pred[melhora] = np.broadcast_to(pred[k], pred.shape)[melhora]
+    return dist, pred
+
+
+def compactar_distancias(dist):
+    # float64 com INF -> int32 com a sentinela; se a matriz for simétrica (sem arcos, ou arcos
+    # sempre aos pares), guarda só o triângulo superior. Custos que não cabem em int32 ficam como estão.
+    finitas = np.isfinite(dist)
+    if finitas.any() and dist[finitas].max() >= INF_INT32:
+        return dist
+    compacta = np.where(finitas, dist, INF_INT32).astype(np.int32)
+    if np.array_equal(compacta, compacta.T):
+        return compacta[np.triu_indices(len(compacta))]
+    return compacta
+
+
+def calcular_distancias(vertices, arestas, arcos, com_predecessores=False):
+    vertices, dist, pred = matriz_adjacencia(vertices, arestas, arcos)
+    dist, pred = floyd_warshall_numpy(dist, pred if com_predecessores else None)
+    distancias = MatrizDistancias(vertices, compactar_distancias(dist))
+    if not com_predecessores:
+        return distancias
+    return distancias, MatrizPredecessores(vertices, pred)
+
+
+def custos_efetivos(arestas, arcos):
+    # Custo de cada ligação dirigida como a matriz de adjacência o vê (repetidas: vale a última)
+    custos = {}
+    for (u, v), custo in arestas:
+        custos[(u, v)] = custo
+        custos[(v, u)] = custo
+    for (u, v), custo in arcos:
+        custos[(u, v)] = custo
+    return custos
+
+
+def lista_adjacencia(vertices, arestas, arcos):
+    custos = custos_efetivos(arestas, arcos)
+
+    adjacencia = {v: [] for v in vertices}
+    for (u, v), custo in custos.items():
+        adjacencia[u].append((v, custo))
+    return adjacencia
+
+
+def dijkstra(adjacencia, origem):
+    distancias = {origem: 0}
+    heap = [(0, origem)]
+    while heap:
+        d, u = heapq.heappop(heap)
+        if d > distancias[u]:
+            continue
+        for v, custo in adjacencia[u]:
+            nova = d + custo
+            if nova < distancias.get(v, INF):
+                distancias[v] = nova
+                heapq.heappush(heap, (nova, v))
+    return distancias
+
+
+def terminais_clientes(clientes, deposito):
+    terminais = [deposito]
+    for c in clientes:
+        terminais.append(c['origem'])
+        terminais.append(c['destino'])
+    return list(dict.fromkeys(terminais))
+
+
+def calcular_distancias_terminais(vertices, arestas, arcos, terminais):
+    # Dijkstra (heap binário) apenas a partir dos terminais: tabela terminal x terminal
+    adjacencia = lista_adjacencia(vertices, arestas, arcos)
+    terminais = list(dict.fromkeys(terminais))
+    dist = np.full((len(terminais), len(terminais)), INF, dtype=np.float64)
+    for i, origem in enumerate(terminais):
+        alcancados = dijkstra(adjacencia, origem)
+        dist[i] = [alcancados.get(v, INF) for v in terminais]
+    return MatrizDistancias(terminais, compactar_distancias(dist))
+
+
+def indices_sequencia(distancias, seq):
+    indice = distancias.indice
+    return np.fromiter((indice[v] for v in seq), dtype=np.intp, count=len(seq))
+
+
+def custos_trechos(distancias, seq, reverso=False):
+    # Custo de cada trecho seq[k] -> seq[k+1] (ou seq[k+1] -> seq[k], com reverso) por indexação
+    # vetorizada da matriz; aceita também um dict-de-dicts comum
+    if not isinstance(distancias, MatrizDistancias):
+        pares = zip(seq[1:], seq) if reverso else zip(seq, seq[1:])
+        return np.array([distancias[u][v] for u, v in pares])
+    idx = indices_sequencia(distancias, seq)
+    if reverso:
+        return distancias.valores(idx[1:], idx[:-1])
+    return distancias.valores(idx[:-1], idx[1:])
+
+
+def custo_sequencia(distancias, seq, reverso=False):
+    if len(seq) < 2:
+        return 0
+    return custos_trechos(distancias, seq, reverso).sum().item()
+
+
+def custos_sequencias(distancias, sequencias, reverso=False):
+    # Avalia várias sequências numa só chamada: concatena os índices, calcula todos os
+    # trechos de uma vez e soma por segmento (os trechos entre sequências são descartados)
+    sequencias = list(sequencias)
+    if not sequencias:
+        return []
+    if not isinstance(distancias, MatrizDistancias):
+        return [custo_sequencia(distancias, seq, reverso) for seq in sequencias]
+    tamanhos = np.fromiter((len(seq) for seq in sequencias), dtype=np.intp, count=len(sequencias))
+    indice = distancias.indice
+    idx = np.fromiter((indice[v] for seq in sequencias for v in seq), dtype=np.intp, count=int(tamanhos.sum()))
+    trechos = distancias.valores(idx[1:], idx[:-1]) if reverso else distancias.valores(idx[:-1], idx[1:])
+    fins = np.cumsum(tamanhos)
+    inicios = fins - tamanhos
+    fronteiras = fins[:-1] - 1
+    trechos[fronteiras[(fronteiras >= 0) & (fronteiras < len(trechos))]] = 0
+    if not np.isfinite(trechos).all():
+        return [custo_sequencia(distancias, seq, reverso) for seq in sequencias]
+    acumulado = np.concatenate(([0], np.cumsum(trechos.astype(np.int64))))
+    # Sequência de tamanho t ocupa os trechos [inicio, inicio + t - 1); vazias somam zero
+    limite = len(acumulado) - 1
+    inicios = np.minimum(inicios, limite)
+    ultimos = np.maximum(np.minimum(fins - 1, limite), inicios)
+    return (acumulado[ultimos] - acumulado[inicios]).tolist()
+
+
+def grafo_esparso(num_vertices, num_arestas, num_arcos, grau_medio_max=8, min_vertices=200):
+    if num_vertices < min_vertices:
+        return False
+    return (2 * num_arestas + num_arcos) / num_vertices <= grau_medio_max
+
+
+def vizinhos_mais_proximos(distancias, k, vertices=None):
+    # Listas de candidatos: para cada vértice, os k vértices mais próximos (entre `vertices`)
+    if vertices is None:
+        vertices = distancias.vertices
+    vertices = [v for v in dict.fromkeys(vertices) if v in distancias.indice]
+    idx = np.array([distancias.indice[v] for v in vertices], dtype=np.int64)
+    sub = np.array(distancias.valores(idx[:, None], idx[None, :]), dtype=np.float64)
+    np.fill_diagonal(sub, INF)
+
+    k = min(k, len(vertices) - 1)
+    if k <= 0:
+        return {v: [] for v in vertices}
+    proximos = np.argpartition(sub, k - 1, axis=1)[:, :k]
+    ordem = np.take_along_axis(sub, proximos, axis=1).argsort(axis=1, kind='stable')
+    proximos = np.take_along_axis(proximos, ordem, axis=1)
+    return {v: [vertices[j] for j in linha] for v, linha in zip(vertices, proximos.tolist())}
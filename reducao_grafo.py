@@ -0,0 +1,89 @@
+from collections import deque
+
+from matriz_distancias import INF, custos_efetivos
+
+
+class ReducaoGrafo:
+    # Grafo reduzido (só arcos dirigidos) com o registro do que foi eliminado:
+    # `atalhos[(a, b)] = v` quando o arco a -> b resume o caminho a -> v -> b, e
+    # `removidos` lista os vértices eliminados na ordem em que saíram.
+    __slots__ = ('vertices', 'arcos', 'atalhos', 'removidos')
+
+    def __init__(self, vertices, arcos, atalhos, removidos):
+        self.vertices = vertices
+        self.arcos = arcos
+        self.atalhos = atalhos
+        self.removidos = removidos
+
+    def expandir(self, caminho):
+        # Troca cada atalho pelo trecho original que ele resume (recursivamente)
+        if not caminho:
+            return []
+        resultado = [caminho[0]]
+        for a, b in zip(caminho, caminho[1:]):
+            pilha = [(a, b)]
+            while pilha:
+                x, y = pilha.pop()
+                via = self.atalhos.get((x, y))
+                if via is None:
+                    resultado.append(y)
+                else:
+                    pilha.append((via, y))
+                    pilha.append((x, via))
+        return resultado
+
+
+def reduzir_grafo(vertices, arestas, arcos, terminais):
+    # Elimina vértices não terminais com no máximo dois vizinhos: cadeias de grau 2 viram
+    # atalhos e pontas soltas (árvores penduradas sem serviço) somem. Eliminar v com atalhos
+    # a -> b para cada par entrada/saída preserva as distâncias entre os vértices restantes.
+    saida = {v: {} for v in vertices}
+    entrada = {v: {} for v in vertices}
+    for (u, v), custo in custos_efetivos(arestas, arcos).items():
+        saida[u][v] = custo
+        entrada[v][u] = custo
+
+    fixos = set(terminais)
+    atalhos = {}
+    removidos = []
+
+    def vizinhos(v):
+        return (saida[v].keys() | entrada[v].keys()) - {v}
+
+    fila = deque(sorted(v for v in saida if v not in fixos))
+    na_fila = set(fila)
+    while fila:
+        v = fila.popleft()
+        na_fila.discard(v)
+        adjacentes = vizinhos(v)
+        if len(adjacentes) > 2:
+            continue
+
+        for a, custo_a in entrada[v].items():
+            if a == v:
+                continue
+            for b, custo_b in saida[v].items():
+                if b == v or b == a:
+                    continue
+                novo = custo_a + custo_b
+                if novo < saida[a].get(b, INF):
+                    saida[a][b] = novo
+                    entrada[b][a] = novo
+                    atalhos[(a, b)] = v
+
+        for a in entrada[v]:
+            saida[a].pop(v, None)
+        for b in saida[v]:
+            entrada[b].pop(v, None)
+        del saida[v]
+        del entrada[v]
+        removidos.append(v)
+
+        for u in adjacentes:
+            if u not in fixos and u not in na_fila:
+                na_fila.add(u)
+                fila.append(u)
+
+    restantes = sorted(saida)
+    arcos_reduzidos = [((u, v), custo) for u in restantes for v, custo in sorted(saida[u].items())]
+    return ReducaoGrafo(restantes, arcos_reduzidos, atalhos, removidos)
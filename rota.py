@@ -0,0 +1,92 @@
+from matriz_distancias import custo_sequencia, custos_sequencias
+
+
+class TabelaServicos:
+    # Tabela única de serviços em colunas (struct-of-arrays); as rotas guardam só índices.
+    __slots__ = ('tipo', 'id', 'origem', 'destino', 'demanda', 'custo')
+
+    def __init__(self, clientes):
+        self.tipo = [c['tipo'] for c in clientes]
+        self.id = [c['id'] for c in clientes]
+        self.origem = [c['origem'] for c in clientes]
+        self.destino = [c['destino'] for c in clientes]
+        self.demanda = [c['demanda'] for c in clientes]
+        self.custo = [c['custo'] for c in clientes]
+
+    def __len__(self):
+        return len(self.id)
+
+
+class Rota:
+    # `servicos` é a lista de índices na TabelaServicos, na ordem de inclusão.
+    # Demanda e custo de serviço são mantidos incrementalmente; o custo de transporte
+    # fica em cache até a sequência mudar (use definir_sequencia).
+    __slots__ = ('tabela', 'servicos', 'sequencia', 'demanda_total', 'custo_servico', '_custo_transporte',
+                 '_custo_reverso')
+
+    def __init__(self, tabela, servicos, sequencia, demanda_total=None, custo_servico=None, custo_transporte=None):
+        self.tabela = tabela
+        self.servicos = servicos
+        self.sequencia = sequencia
+        if demanda_total is None:
+            demanda_total = sum(tabela.demanda[s] for s in servicos)
+        if custo_servico is None:
+            custo_servico = sum(tabela.custo[s] for s in servicos)
+        self.demanda_total = demanda_total
+        self.custo_servico = custo_servico
+        self._custo_transporte = custo_transporte
+        self._custo_reverso = None
+
+    @classmethod
+    def unitaria(cls, tabela, s, deposito):
+        return cls(tabela, [s], [deposito, tabela.origem[s], tabela.destino[s], deposito],
+                   tabela.demanda[s], tabela.custo[s])
+
+    def juntar(self, outra, sequencia, custo_transporte=None):
+        return Rota(self.tabela, self.servicos + outra.servicos, sequencia,
+                    self.demanda_total + outra.demanda_total,
+                    self.custo_servico + outra.custo_servico, custo_transporte)
+
+    def adicionar(self, s, sequencia, custo_transporte=None):
+        self.servicos.append(s)
+        self.demanda_total += self.tabela.demanda[s]
+        self.custo_servico += self.tabela.custo[s]
+        self.definir_sequencia(sequencia, custo_transporte)
+
+    def definir_sequencia(self, sequencia, custo_transporte=None):
+        self.sequencia = sequencia
+        self._custo_transporte = custo_transporte
+        self._custo_reverso = None
+
+    def custo_transporte(self, distancias):
+        if self._custo_transporte is None:
+            self._custo_transporte = custo_sequencia(distancias, self.sequencia)
+        return self._custo_transporte
+
+    def custo_transporte_reverso(self, distancias):
+        # Custo de percorrer a sequência de trás para frente (difere do direto com arcos)
+        if self._custo_reverso is None:
+            self._custo_reverso = custo_sequencia(distancias, self.sequencia, reverso=True)
+        return self._custo_reverso
+
+    def custo_total(self, distancias):
+        return self.custo_transporte(distancias) + self.custo_servico
+
+    def __len__(self):
+        return len(self.servicos)
+
+
+def avaliar_rotas(rotas, distancias):
+    # Preenche de uma vez (uma chamada vetorizada por sentido) os custos ainda fora do cache
+    pendentes = [r for r in rotas if r._custo_transporte is None]
+    for rota, custo in zip(pendentes, custos_sequencias(distancias, [r.sequencia for r in pendentes])):
+        rota._custo_transporte = custo
+    pendentes = [r for r in rotas if r._custo_reverso is None]
+    for rota, custo in zip(pendentes, custos_sequencias(distancias, [r.sequencia for r in pendentes], True)):
+        rota._custo_reverso = custo
+    return rotas
+
+
+def custo_solucao(rotas, distancias):
+    avaliar_rotas(rotas, distancias)
+    return sum(r.custo_transporte(distancias) + r.custo_servico for r in rotas)